@@ -7,6 +7,10 @@ Downloads to Downloads folder with proper filename and folder restrictions
 import os
 import sys
 import hashlib
+import mmap
+import queue
+import socket
+import struct
 import requests
 import subprocess
 import tempfile
@@ -14,10 +18,354 @@ import shutil
 from pathlib import Path
 from urllib.parse import urlparse
 import argparse
+import asyncio
+import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 1024 * 1024  # 1MB reads from the network
+PART_SIZE = 16 * 1024 * 1024  # Byte range fetched by one request in parallel mode
+MIN_PARALLEL_SIZE = 2 * PART_SIZE  # Smaller files are not worth splitting
+PART_RETRIES = 3
+HASH_READ_SIZE = 8 * 1024 * 1024  # Large reads keep standalone hashing disk-bound, not syscall-bound
+
+# clamd sockets tried when --clamd is not given (Linux packages, Homebrew on Apple Silicon and Intel)
+CLAMD_SOCKETS = [
+    '/var/run/clamav/clamd.ctl',
+    '/var/run/clamd.scan/clamd.sock',
+    '/opt/homebrew/var/run/clamav/clamd.sock',
+    '/usr/local/var/run/clamav/clamd.sock',
+]
+CLAMD_PORT = 3310
+SCAN_TIMEOUT = 60  # Seconds allowed for any scan, on top of the size-based allowance
+SCAN_RATE = 20 * 1024 * 1024  # Conservative bytes/s a scanner gets through
+SCAN_CACHE = Path.home() / ".cache" / "simple_mkv_downloader" / "scan_verdicts.json"
+
+def scan_timeout(size):
+    """Seconds to wait for a scan verdict on a file of this size"""
+    return SCAN_TIMEOUT + size / SCAN_RATE
+
+class PrefixHasher:
+    """Hash a file front to back while its parts are still being written out of order
+    
+    Parts are handed over as they finish; a background thread feeds every contiguous
+    run from the start of the file to the digests, reading bytes that were written
+    moments ago and are still in the page cache.
+    """
+    
+    def __init__(self, fd, total_size, algorithms, scanner=None):
+        self.fd = fd
+        self.total_size = total_size
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+        self.scanner = scanner
+        self.ready = {}
+        self.offset = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def add(self, start, end):
+        with self.cond:
+            self.ready[start] = end
+            self.cond.notify()
+    
+    def _run(self):
+        while self.offset < self.total_size:
+            with self.cond:
+                while self.offset not in self.ready and not self.closed:
+                    self.cond.wait()
+                if self.offset not in self.ready:
+                    return
+                end = self.ready.pop(self.offset)
+            
+            offset = self.offset
+            while offset <= end:
+                chunk = os.pread(self.fd, min(HASH_READ_SIZE, end + 1 - offset), offset)
+                if not chunk:
+                    return
+                for hasher in self.hashers.values():
+                    hasher.update(chunk)
+                if self.scanner:
+                    self.scanner.feed(chunk)
+                offset += len(chunk)
+            self.offset = offset
+    
+    def close(self):
+        """Wait for the hashing thread; returns the digests, or None if the file is incomplete"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        if self.offset < self.total_size:
+            return None
+        return {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+
+class ClamdStream:
+    """Stream a file to clamd with INSTREAM while it is still downloading
+    
+    Chunks are queued by feed() and sent by a background thread, so a slow daemon
+    never stalls the caller for long; finish() sends the terminator and waits for the
+    verdict, abort() drops the stream before clamd starts scanning.
+    """
+    
+    def __init__(self, address):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(30)
+        self.sock.connect(address)
+        self.sock.sendall(b'zINSTREAM\0')
+        self.error = None
+        self.queue = queue.Queue(maxsize=8)
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
+    
+    def feed(self, chunk):
+        if self.error is None:
+            self.queue.put(chunk)
+    
+    def _send(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.sock.sendall(struct.pack('>I', len(chunk)))
+                self.sock.sendall(chunk)
+            except OSError as e:
+                # clamd hangs up once StreamMaxLength is reached; its reply says so
+                self.error = e
+    
+    def finish(self, timeout):
+        """Returns ('clean', None), ('infected', signature), ('limit', reply) when the file
+        is longer than clamd's StreamMaxLength, or ('error', reason)"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is None:
+            try:
+                self.sock.sendall(struct.pack('>I', 0))
+            except OSError as e:
+                # clamd may already have replied and hung up (StreamMaxLength); read the reply anyway
+                self.error = e
+        try:
+            self.sock.settimeout(timeout)
+            reply = b''
+            while not reply.endswith(b'\0'):
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+                reply += data
+        except socket.timeout:
+            return 'error', f"no verdict after {timeout:.0f}s"
+        except OSError as e:
+            return 'error', str(e)
+        finally:
+            self.sock.close()
+        
+        reply = reply.rstrip(b'\0').decode('utf-8', 'replace').strip()
+        if reply.endswith(' OK'):
+            return 'clean', None
+        if reply.endswith(' FOUND'):
+            return 'infected', reply.split(': ', 1)[-1][:-len(' FOUND')]
+        if 'size limit exceeded' in reply:
+            return 'limit', reply
+        return 'error', reply or str(self.error or 'connection closed')
+    
+    def abort(self):
+        self.error = self.error or 'aborted'
+        self.queue.put(None)
+        self.thread.join()
+        self.sock.close()
+
+class MatroskaError(ValueError):
+    """Structural problem found while walking a Matroska file"""
+
+class MatroskaValidator:
+    """Walk the EBML element tree of a Matroska file without reading its payloads
+    
+    Only element headers are decoded (over mmap), so the cost follows the number of
+    elements rather than the file size. A truncated download fails on the first
+    element that runs past the end of the file, usually the Segment itself.
+    """
+    
+    EBML = 0x1A45DFA3
+    DOC_TYPE = 0x4282
+    SEGMENT = 0x18538067
+    TRACKS = 0x1654AE6B
+    TRACK_ENTRY = 0xAE
+    TRACK_NUMBER = 0xD7
+    TRACK_TYPE = 0x83
+    CODEC_ID = 0x86
+    CLUSTER = 0x1F43B675
+    CLUSTER_TIMECODE = 0xE7
+    CUES = 0x1C53BB6B
+    
+    # Elements that may appear directly inside a Segment
+    SEGMENT_CHILDREN = {
+        0x114D9B74, 0x1549A966, TRACKS, CLUSTER, CUES, 0x1043A770, 0x1254C367,
+        0x1941A469, 0xEC, 0xBF,
+    }
+    
+    def __init__(self, buf):
+        self.buf = buf
+        self.size = len(buf)
+    
+    def vint(self, pos, keep_marker):
+        """Decode an EBML variable-length integer; returns (value, length, all_ones)"""
+        if pos >= self.size:
+            raise MatroskaError(f"truncated at byte {pos:,}")
+        first = self.buf[pos]
+        if first == 0:
+            raise MatroskaError(f"invalid element header at byte {pos:,}")
+        length = 9 - first.bit_length()
+        if pos + length > self.size:
+            raise MatroskaError(f"truncated at byte {pos:,}")
+        value = int.from_bytes(self.buf[pos:pos + length], 'big')
+        if keep_marker:
+            return value, length, False
+        value &= (1 << (7 * length)) - 1
+        return value, length, value == (1 << (7 * length)) - 1
+    
+    def element(self, pos):
+        """Header at pos; returns (id, data_start, data_size), with None for an unknown size"""
+        element_id, id_length, _ = self.vint(pos, keep_marker=True)
+        if id_length > 4:
+            raise MatroskaError(f"invalid element ID at byte {pos:,}")
+        size, size_length, unknown = self.vint(pos + id_length, keep_marker=False)
+        return element_id, pos + id_length + size_length, None if unknown else size
+    
+    def children(self, start, end):
+        """(id, data_start, data_size) for each child of a known-size element"""
+        pos = start
+        while pos < end:
+            element_id, data_start, size = self.element(pos)
+            if size is None or data_start + size > end:
+                raise MatroskaError(f"element 0x{element_id:X} at byte {pos:,} overruns its parent")
+            yield element_id, data_start, size
+            pos = data_start + size
+    
+    def uint(self, start, size):
+        return int.from_bytes(self.buf[start:start + size], 'big')
+    
+    def validate(self):
+        """Check the structure; returns a one-line summary or raises MatroskaError"""
+        element_id, data_start, size = self.element(0)
+        if element_id != self.EBML or size is None or data_start + size > self.size:
+            raise MatroskaError("missing EBML header")
+        doc_type = b''
+        for child_id, child_start, child_size in self.children(data_start, data_start + size):
+            if child_id == self.DOC_TYPE:
+                doc_type = bytes(self.buf[child_start:child_start + child_size]).rstrip(b'\0')
+        if doc_type not in (b'matroska', b'webm'):
+            raise MatroskaError(f"unexpected DocType {doc_type!r}")
+        
+        pos = data_start + size
+        element_id, segment_start, segment_size = self.element(pos)
+        if element_id != self.SEGMENT:
+            raise MatroskaError(f"expected a Segment at byte {pos:,}")
+        if segment_size is None:
+            segment_end = self.size  # Live recordings leave the size unknown
+        elif segment_start + segment_size > self.size:
+            raise MatroskaError(f"truncated: Segment needs {segment_start + segment_size:,} bytes, "
+                                f"file has {self.size:,}")
+        else:
+            segment_end = segment_start + segment_size
+        
+        codecs, clusters, has_cues, last_timecode = None, 0, False, -1
+        pos = segment_start
+        while pos < segment_end:
+            element_id, data_start, size = self.element(pos)
+            if element_id not in self.SEGMENT_CHILDREN:
+                raise MatroskaError(f"unexpected element 0x{element_id:X} in Segment at byte {pos:,}")
+            if size is None:
+                if element_id != self.CLUSTER:
+                    raise MatroskaError(f"element 0x{element_id:X} at byte {pos:,} has an unknown size")
+                data_end = self.unknown_cluster_end(data_start, segment_end)
+            else:
+                data_end = data_start + size
+                if data_end > segment_end:
+                    raise MatroskaError(f"truncated: element 0x{element_id:X} at byte {pos:,} "
+                                        f"runs past byte {segment_end:,}")
+            
+            if element_id == self.TRACKS:
+                codecs = self.track_codecs(data_start, data_end)
+            elif element_id == self.CLUSTER:
+                if codecs is None:
+                    raise MatroskaError(f"Cluster at byte {pos:,} comes before any track headers")
+                timecode = self.cluster_timecode(data_start, data_end)
+                if timecode is None:
+                    raise MatroskaError(f"Cluster at byte {pos:,} has no timecode")
+                if timecode < last_timecode:
+                    raise MatroskaError(f"Cluster at byte {pos:,} goes back in time ({timecode} < {last_timecode})")
+                last_timecode = timecode
+                clusters += 1
+            elif element_id == self.CUES:
+                has_cues = True
+            pos = data_end
+        
+        if codecs is None:
+            raise MatroskaError("no track headers")
+        if not clusters:
+            raise MatroskaError("no clusters (no media data)")
+        
+        summary = f"{len(codecs)} tracks ({', '.join(codecs)}), {clusters:,} clusters"
+        if not has_cues:
+            summary += ", no Cues (seeking will be slow)"
+        return summary
+    
+    def track_codecs(self, start, end):
+        codecs = []
+        for child_id, child_start, child_size in self.children(start, end):
+            if child_id != self.TRACK_ENTRY:
+                continue
+            fields = {}
+            for field_id, field_start, field_size in self.children(child_start, child_start + child_size):
+                fields[field_id] = (field_start, field_size)
+            missing = [name for name, field_id in (('number', self.TRACK_NUMBER), ('type', self.TRACK_TYPE),
+                                                   ('codec', self.CODEC_ID)) if field_id not in fields]
+            if missing:
+                raise MatroskaError(f"track entry at byte {child_start:,} is missing its {', '.join(missing)}")
+            codec_start, codec_size = fields[self.CODEC_ID]
+            codecs.append(bytes(self.buf[codec_start:codec_start + codec_size]).rstrip(b'\0').decode('ascii', 'replace'))
+        if not codecs:
+            raise MatroskaError("Tracks element has no track entries")
+        return codecs
+    
+    def cluster_timecode(self, start, end):
+        # The timecode leads the cluster; no need to walk its blocks
+        for index, (child_id, child_start, child_size) in enumerate(self.children(start, end)):
+            if child_id == self.CLUSTER_TIMECODE:
+                return self.uint(child_start, child_size)
+            if index >= 3:
+                return None
+        return None
+    
+    def unknown_cluster_end(self, start, segment_end):
+        """End of an unknown-size cluster: the next Segment-level element or the segment end"""
+        pos = start
+        while pos < segment_end:
+            element_id, data_start, size = self.element(pos)
+            if element_id in self.SEGMENT_CHILDREN and element_id not in (0xEC, 0xBF):
+                return pos
+            if size is None or data_start + size > segment_end:
+                raise MatroskaError(f"truncated: cluster element at byte {pos:,} runs past the end")
+            pos = data_start + size
+        return pos
+
+def make_session(pool_size):
+    """requests session whose keep-alive pool holds pool_size connections per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
 class SimpleMKVDownloader:
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, connections=8, resume=True, digests=('sha256',), session=None, clamd=None):
         # Default to Downloads folder
         if output_dir is None:
             self.output_dir = Path.home() / "Downloads"
@@ -25,6 +373,22 @@ class SimpleMKVDownloader:
             self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
+        # One pooled session so parallel range requests reuse their connections
+        self.connections = max(1, connections)
+        self.resume = resume
+        
+        # Digests computed while downloading, so the file is not read a second time
+        self.digests = tuple(dict.fromkeys(('sha256',) + tuple(digests)))
+        self.file_digests = None
+        self.session = session or make_session(self.connections)
+        self.show_progress = True
+        self._progress_lock = threading.Lock()
+        
+        # clamd scans the file while it downloads; without a daemon clamscan runs afterwards
+        self.clamd = clamd if clamd is not None else find_clamd()
+        self.pending_scan = None
+        self.scan_engine = None
+        
     def download_file(self, url, custom_headers=None):
         """Download file with proper filename to Downloads"""
         headers = {
@@ -41,76 +405,394 @@ class SimpleMKVDownloader:
             headers.update(custom_headers)
         
         print(f"📥 Starting download from: {url}")
+        self.file_digests = None
+        self.cancel_scan()
         
         try:
-            # Get proper filename from URL
-            parsed_url = urlparse(url)
-            filename = os.path.basename(parsed_url.path)
+            filepath = self.target_path(url)
             
-            # Clean up filename and ensure .mkv extension
-            if not filename or filename == "/":
-                filename = "downloaded_video.mkv"
-            elif not filename.endswith('.mkv'):
-                filename += '.mkv'
-            
-            # Remove any invalid characters from filename
-            filename = "".join(c for c in filename if c.isalnum() or c in ".-_").strip()
-            if not filename:
-                filename = "video.mkv"
-                
-            filepath = self.output_dir / filename
-            
-            # If file exists, add timestamp
-            if filepath.exists():
-                name_part = filepath.stem
-                ext_part = filepath.suffix
-                timestamp = int(time.time())
-                filepath = self.output_dir / f"{name_part}_{timestamp}{ext_part}"
+            # Data lands in a stable .part file next to its resume state, so an interrupted
+            # download is picked up again by the next run instead of starting a new file
+            partial_path = filepath.with_name(filepath.name + '.part')
+            state_path = filepath.with_name(filepath.name + '.part.json')
             
             print(f"📁 Saving to: {filepath}")
             
-            # Start download with streaming
             self._start_time = time.time()
-            response = requests.get(url, headers=headers, stream=True, timeout=30, allow_redirects=True)
-            response.raise_for_status()
+            total_size, accepts_ranges, content_type, validators = self.probe_download(url, headers)
             
             # Check if this is actually a video file
-            content_type = response.headers.get('content-type', '').lower()
             if 'text/html' in content_type:
                 print("⚠️  Response appears to be HTML, not a video file")
                 print("💡 The URL might be a page URL, not a direct download link")
                 return None
             
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
             print(f"📦 File size: {total_size / (1024*1024*1024):.2f} GB")
             
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            speed_mb = downloaded / (1024*1024) / max(1, time.time() - self._start_time)
-                            print(f"\rProgress: {progress:.1f}% | {downloaded/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB | Speed: {speed_mb:.1f} MB/s", end="")
+            progress = None
+            if self.resume and accepts_ranges and total_size:
+                progress = self.load_resume_state(state_path, partial_path, url, total_size, validators)
+            if progress is None:
+                self.discard_partial(partial_path, state_path)
+                progress = {
+                    'url': url,
+                    'size': total_size,
+                    'part_size': PART_SIZE,
+                    'etag': validators['etag'],
+                    'last_modified': validators['last_modified'],
+                    'completed': [],
+                }
+            
+            downloaded = None
+            digests = {}
+            self.pending_scan = self.open_scan()
+            if accepts_ranges and total_size and (self.resume or (self.connections > 1 and total_size >= MIN_PARALLEL_SIZE)):
+                downloaded = self.download_ranged(url, headers, partial_path, total_size, validators,
+                                                  progress, state_path if self.resume else None, digests)
+                if downloaded is None:
+                    print("\n⚠️  Server ignored range requests (or the file changed), falling back to a single stream")
+                    self.discard_partial(partial_path, state_path)
+                    self.cancel_scan()
+                    self.pending_scan = self.open_scan()
+            if downloaded is None:
+                digests = {}
+                downloaded = self.download_single(url, headers, partial_path, digests)
+                if downloaded is None:
+                    self.cancel_scan()
+                    return None
+            
+            filepath = self.finalize_download(partial_path, filepath)
+            self.file_digests = digests or None
+            if state_path.exists():
+                state_path.unlink()
             
             print(f"\n✅ Downloaded: {filepath} ({downloaded:,} bytes)")
             return filepath
             
         except Exception as e:
             print(f"❌ Download failed: {e}")
+            self.cancel_scan()
+            return None
+    
+    def open_scan(self):
+        """Start an INSTREAM scan to feed during the download, or None without clamd"""
+        if not self.clamd:
+            return None
+        try:
+            return ClamdStream(self.clamd)
+        except OSError as e:
+            print(f"⚠️  clamd unavailable ({e}), the file will be scanned after download")
+            return None
+    
+    def cancel_scan(self):
+        if self.pending_scan is not None:
+            self.pending_scan.abort()
+            self.pending_scan = None
+    
+    def target_path(self, url):
+        """Where a URL is saved: its cleaned-up file name (with .mkv) in the output folder"""
+        # Get proper filename from URL
+        parsed_url = urlparse(url)
+        filename = os.path.basename(parsed_url.path)
+        
+        # Clean up filename and ensure .mkv extension
+        if not filename or filename == "/":
+            filename = "downloaded_video.mkv"
+        elif not filename.endswith('.mkv'):
+            filename += '.mkv'
+        
+        # Remove any invalid characters from filename
+        filename = "".join(c for c in filename if c.isalnum() or c in ".-_").strip()
+        if not filename:
+            filename = "video.mkv"
+        
+        return self.output_dir / filename
+    
+    def probe_download(self, url, headers):
+        """Size, range support, content type and ETag/Last-Modified validators from a HEAD
+        request (or a 1-byte range GET)"""
+        total_size, accepts_ranges, content_type = 0, False, ''
+        validators = {'etag': None, 'last_modified': None}
+        
+        try:
+            response = self.session.head(url, headers=headers, timeout=30, allow_redirects=True)
+            if response.ok:
+                total_size = int(response.headers.get('content-length', 0))
+                accepts_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+                content_type = response.headers.get('content-type', '').lower()
+                validators = self._validators(response)
+        except requests.RequestException:
+            pass
+        
+        # Some servers answer HEAD badly or leave out Accept-Ranges; ask for one byte instead
+        if not accepts_ranges or not total_size:
+            probe_headers = dict(headers, Range='bytes=0-0')
+            probe_headers['Accept-Encoding'] = 'identity'
+            with self.session.get(url, headers=probe_headers, stream=True, timeout=30, allow_redirects=True) as response:
+                response.raise_for_status()
+                content_type = response.headers.get('content-type', '').lower()
+                validators = self._validators(response)
+                content_range = response.headers.get('content-range', '')
+                if response.status_code == 206 and '/' in content_range and not content_range.endswith('/*'):
+                    total_size = int(content_range.rsplit('/', 1)[1])
+                    accepts_ranges = True
+                else:
+                    total_size = int(response.headers.get('content-length', 0))
+                    accepts_ranges = False
+        
+        return total_size, accepts_ranges, content_type, validators
+    
+    @staticmethod
+    def _validators(response):
+        return {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+        }
+    
+    def load_resume_state(self, state_path, partial_path, url, total_size, validators):
+        """Progress saved by an earlier run, or None when there is nothing safe to resume"""
+        if not state_path.exists() or not partial_path.exists():
+            return None
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            print("⚠️  Resume state is unreadable, starting over")
+            return None
+        
+        if state.get('size') != total_size or state.get('part_size') != PART_SIZE:
+            print("🔄 Server file size changed since the last attempt, starting over")
+            return None
+        
+        # A changed ETag or Last-Modified means the bytes on disk belong to an older version
+        if any(state.get(key) != value for key, value in validators.items()):
+            print("🔄 Server file changed since the last attempt, starting over")
             return None
+        
+        # Signed URLs change between runs; a matching strong ETag still identifies the file
+        etag = validators['etag']
+        if state.get('url') != url and not (etag and not etag.startswith('W/')):
+            return None
+        
+        done = sum(record['end'] + 1 - record['start'] for record in state.get('completed', []))
+        print(f"⏯️  Resuming: {done / (1024*1024):.1f}MB of {total_size / (1024*1024):.1f}MB already on disk")
+        state['url'] = url
+        return state
+    
+    def save_resume_state(self, state_path, state):
+        """Write the resume state atomically so a crash never leaves it half written"""
+        tmp_path = state_path.with_name(state_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    
+    def discard_partial(self, partial_path, state_path):
+        for path in (partial_path, state_path):
+            if path.exists():
+                path.unlink()
     
-    def calculate_hash(self, filepath):
-        """Calculate SHA256 hash"""
+    def finalize_download(self, partial_path, filepath):
+        """Move a finished .part file into place; if the name is taken, add a timestamp"""
+        if filepath.exists():
+            name_part = filepath.stem
+            ext_part = filepath.suffix
+            timestamp = int(time.time())
+            renamed = self.output_dir / f"{name_part}_{timestamp}{ext_part}"
+            print(f"\n📁 {filepath.name} already exists, saving as {renamed.name}")
+            filepath = renamed
+        os.replace(partial_path, filepath)
+        return filepath
+    
+    def verify_parts(self, fd, completed):
+        """Keep only the recorded parts whose bytes on disk still match their SHA256"""
+        def intact(record):
+            digest = hashlib.sha256()
+            offset = record['start']
+            while offset <= record['end']:
+                chunk = os.pread(fd, min(CHUNK_SIZE, record['end'] + 1 - offset), offset)
+                if not chunk:
+                    return False
+                digest.update(chunk)
+                offset += len(chunk)
+            return digest.hexdigest() == record['sha256']
+        
+        print(f"🔍 Verifying {len(completed)} finished parts...")
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            checks = list(pool.map(intact, completed))
+        
+        kept = []
+        for record, ok in zip(completed, checks):
+            if ok:
+                kept.append(record)
+            else:
+                print(f"⚠️  Part {record['start']}-{record['end']} failed verification, fetching it again")
+        return kept
+    
+    def _report_progress(self, downloaded, total_size):
+        if self.show_progress and total_size > 0:
+            progress = (downloaded / total_size) * 100
+            speed_mb = downloaded / (1024*1024) / max(1, time.time() - self._start_time)
+            print(f"\rProgress: {progress:.1f}% | {downloaded/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB | Speed: {speed_mb:.1f} MB/s", end="")
+    
+    def download_single(self, url, headers, filepath, digests=None):
+        """Stream the whole file over one connection; returns the byte count
+        
+        The configured digests are updated from each chunk as it arrives and stored
+        in the digests dict as hex strings.
+        """
+        response = self.session.get(url, headers=headers, stream=True, timeout=30, allow_redirects=True)
+        response.raise_for_status()
+        
+        total_size = int(response.headers.get('content-length', 0))
+        downloaded = 0
+        hashers = {name: hashlib.new(name) for name in self.digests}
+        
+        with open(filepath, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    if self.pending_scan:
+                        self.pending_scan.feed(chunk)
+                    downloaded += len(chunk)
+                    self._report_progress(downloaded, total_size)
+        
+        if digests is not None:
+            digests.update({name: hasher.hexdigest() for name, hasher in hashers.items()})
+        return downloaded
+    
+    def download_ranged(self, url, headers, filepath, total_size, validators, progress, state_path=None, digests=None):
+        """Fetch PART_SIZE byte ranges over parallel connections into a preallocated file
+        
+        Parts listed in progress['completed'] are re-hashed and skipped; each part is only
+        recorded (with its SHA256) once all of its bytes are written, and the record is
+        saved to state_path. Whole-file digests come from a PrefixHasher that follows the
+        written parts, and 'sha256-tree' (the SHA256 of the concatenated per-part SHA256s)
+        from the part records; both land in the digests dict. Returns the byte count, or None when the server answers a
+        range request with the whole file (the caller then falls back to a single stream).
+        """
+        parts = [(start, min(start + PART_SIZE, total_size) - 1) for start in range(0, total_size, PART_SIZE)]
+        
+        # Ranges must be of the stored bytes, not of a compressed transfer encoding
+        range_headers = dict(headers)
+        range_headers['Accept-Encoding'] = 'identity'
+        
+        # If-Range makes a server whose file changed send it whole instead of mixing versions
+        etag = validators['etag']
+        if etag and not etag.startswith('W/'):
+            range_headers['If-Range'] = etag
+        elif validators['last_modified']:
+            range_headers['If-Range'] = validators['last_modified']
+        
+        resuming = bool(progress['completed']) and os.path.exists(filepath)
+        flags = os.O_RDWR | os.O_CREAT | (0 if resuming else os.O_TRUNC)
+        fd = os.open(filepath, flags, 0o644)
+        state = {'downloaded': 0, 'ranges_ignored': False, 'saved_at': time.time()}
+        hasher = None
+        try:
+            # Reserve the space up front so parts can be written in place in any order
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, total_size)
+            else:
+                os.ftruncate(fd, total_size)
+            
+            if resuming:
+                progress['completed'] = self.verify_parts(fd, progress['completed'])
+            else:
+                progress['completed'] = []
+            finished = {record['start'] for record in progress['completed']}
+            pending = [part for part in parts if part[0] not in finished]
+            state['downloaded'] = sum(end + 1 - start for start, end in parts if start in finished)
+            
+            hasher = PrefixHasher(fd, total_size, self.digests, self.pending_scan)
+            for record in progress['completed']:
+                hasher.add(record['start'], record['end'])
+            
+            workers = max(1, min(self.connections, len(pending)))
+            print(f"⚡ Downloading {len(pending)} of {len(parts)} parts over {workers} connections")
+            
+            def fetch(part):
+                start, end = part
+                offset = start
+                digest = hashlib.sha256()
+                for attempt in range(PART_RETRIES):
+                    if state['ranges_ignored']:
+                        return
+                    try:
+                        part_headers = dict(range_headers, Range=f'bytes={offset}-{end}')
+                        with self.session.get(url, headers=part_headers, stream=True, timeout=30) as response:
+                            response.raise_for_status()
+                            if response.status_code != 206:
+                                state['ranges_ignored'] = True
+                                return
+                            # A 206 for some other range would land its bytes in the wrong place
+                            content_range = response.headers.get('content-range', '')
+                            if not content_range.startswith(f'bytes {offset}-'):
+                                print(f"\n⚠️  Asked for bytes {offset}-{end}, got '{content_range}'; ranges look unreliable")
+                                state['ranges_ignored'] = True
+                                return
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                if not chunk:
+                                    continue
+                                chunk = chunk[:end + 1 - offset]
+                                os.pwrite(fd, chunk, offset)
+                                digest.update(chunk)
+                                offset += len(chunk)
+                                with self._progress_lock:
+                                    state['downloaded'] += len(chunk)
+                                    self._report_progress(state['downloaded'], total_size)
+                        if offset > end:
+                            with self._progress_lock:
+                                progress['completed'].append({'start': start, 'end': end, 'sha256': digest.hexdigest()})
+                                hasher.add(start, end)
+                                # Rewriting the state for every part adds up on big files; once a second is plenty
+                                if state_path and time.time() - state['saved_at'] >= 1.0:
+                                    self.save_resume_state(state_path, progress)
+                                    state['saved_at'] = time.time()
+                            return
+                    except requests.RequestException as e:
+                        if attempt == PART_RETRIES - 1:
+                            raise
+                        print(f"\n⚠️  Part {start}-{end} interrupted ({e}), retrying from byte {offset}")
+                raise IOError(f"Part {start}-{end} ended early at byte {offset}")
+            
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for _ in pool.map(fetch, pending):
+                    pass
+            
+            if digests is not None and not state['ranges_ignored']:
+                digests.update(hasher.close() or {})
+                records = sorted(progress['completed'], key=lambda record: record['start'])
+                tree = hashlib.sha256(b''.join(bytes.fromhex(record['sha256']) for record in records))
+                digests[f'sha256-tree-{PART_SIZE // (1024*1024)}mb'] = tree.hexdigest()
+        finally:
+            if hasher is not None:
+                hasher.close()
+            os.close(fd)
+            # Whatever finished is kept for the next run, including after a failure
+            if state_path and not state['ranges_ignored']:
+                with self._progress_lock:
+                    self.save_resume_state(state_path, progress)
+        
+        if state['ranges_ignored']:
+            return None
+        return state['downloaded']
+    
+    def calculate_hash(self, filepath, algorithm='sha256'):
+        """Calculate a file hash (SHA256 by default)"""
         print("🔐 Calculating file hash...")
-        hash_sha256 = hashlib.sha256()
         with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, algorithm).hexdigest()
+            hasher = hashlib.new(algorithm)
+            buffer = memoryview(bytearray(HASH_READ_SIZE))
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hasher.update(buffer[:size])
+            return hasher.hexdigest()
     
     def basic_file_check(self, filepath):
         """Basic file validation"""
@@ -130,8 +812,16 @@ class SimpleMKVDownloader:
             # MKV files should start with EBML signature
             if not (header.startswith(b'\x1a\x45\xdf\xa3') or b'matroska' in header.lower()):
                 print("⚠️  Warning: File doesn't appear to be a valid MKV")
+                return True, f"File appears valid ({file_size:,} bytes)"
+            
+            # Walk the element tree so truncated or corrupt files fail here, not mid-enhancement
+            with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                try:
+                    structure = MatroskaValidator(buf).validate()
+                except MatroskaError as e:
+                    return False, f"Broken Matroska file: {e}"
             
-            return True, f"File appears valid ({file_size:,} bytes)"
+            return True, f"File appears valid ({file_size:,} bytes; {structure})"
             
         except Exception as e:
             return False, f"File check failed: {e}"
@@ -150,21 +840,91 @@ class SimpleMKVDownloader:
         except:
             print("⚠️  XProtect check failed")
         
-        # ClamAV check if available
+        # ClamAV check, skipped when this exact file already has a verdict from this engine
+        sha256 = (self.file_digests or {}).get('sha256') or self.calculate_hash(filepath)
+        engine = self.clamav_engine()
+        cached = load_verdict(sha256, engine) if engine else None
+        if cached:
+            self.cancel_scan()
+            verdict, signature = cached['verdict'], cached.get('signature')
+            print(f"💾 ClamAV verdict cached for this SHA256 ({engine})")
+        else:
+            verdict, signature = self.clamav_scan(filepath)
+            if verdict in ('clean', 'infected') and engine:
+                store_verdict(sha256, engine, verdict, signature)
+        
+        if verdict == 'clean':
+            print("✅ ClamAV: Clean")
+        elif verdict == 'infected':
+            print(f"❌ ClamAV detected issues: {signature}")
+            return False
+        elif verdict == 'missing':
+            print("💡 ClamAV not available (install with: brew install clamav)")
+        else:
+            print(f"⚠️  ClamAV scan incomplete: {signature}")
+        
+        return True
+    
+    def clamav_engine(self):
+        """ClamAV engine and signature database version, used to key cached verdicts"""
+        if self.scan_engine is None:
+            self.scan_engine = ''
+            try:
+                if self.clamd:
+                    family = socket.AF_UNIX if isinstance(self.clamd, str) else socket.AF_INET
+                    with socket.socket(family, socket.SOCK_STREAM) as sock:
+                        sock.settimeout(10)
+                        sock.connect(self.clamd)
+                        sock.sendall(b'zVERSION\0')
+                        self.scan_engine = sock.recv(4096).rstrip(b'\0').decode('utf-8', 'replace').strip()
+                else:
+                    result = subprocess.run(['clamscan', '--version'], capture_output=True, text=True, timeout=30)
+                    self.scan_engine = result.stdout.strip()
+            except (OSError, subprocess.SubprocessError):
+                pass
+        return self.scan_engine
+    
+    def clamav_scan(self, filepath):
+        """Verdict for a downloaded file: ('clean' | 'infected' | 'error' | 'missing', detail)"""
+        size = filepath.stat().st_size
+        
+        # Usually the bytes already went to clamd during the download and only the verdict is left
+        stream, self.pending_scan = self.pending_scan, None
+        if stream is None and self.clamd:
+            stream = self.open_scan()
+            if stream is not None:
+                with open(filepath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_READ_SIZE), b''):
+                        stream.feed(chunk)
+        if stream is not None:
+            verdict, detail = stream.finish(scan_timeout(size))
+            if verdict != 'limit':
+                return verdict, detail
+            
+            # clamd only read the first StreamMaxLength bytes (25 MB by default); scan the whole file locally
+            print(f"⚠️  clamd stopped at its StreamMaxLength ({detail}), scanning the file with clamscan")
+            verdict, detail = self.clamscan_file(filepath, size)
+            if verdict == 'missing':
+                return 'error', ("file is larger than clamd's StreamMaxLength and clamscan is not installed; "
+                                 "raise StreamMaxLength in clamd.conf")
+            return verdict, detail
+        
+        return self.clamscan_file(filepath, size)
+    
+    def clamscan_file(self, filepath, size):
+        """Scan a finished file with the clamscan command line scanner"""
         try:
             result = subprocess.run(['clamscan', '--no-summary', str(filepath)], 
-                                  capture_output=True, text=True, timeout=60)
-            if result.returncode == 0:
-                print("✅ ClamAV: Clean")
-            else:
-                print(f"❌ ClamAV detected issues: {result.stdout.strip()}")
-                return False
+                                  capture_output=True, text=True, timeout=scan_timeout(size))
         except FileNotFoundError:
-            print("💡 ClamAV not available (install with: brew install clamav)")
+            return 'missing', None
         except subprocess.TimeoutExpired:
-            print("⚠️  ClamAV scan timeout")
-        
-        return True
+            return 'error', f"timed out after {scan_timeout(size):.0f}s"
+        if result.returncode == 0:
+            return 'clean', None
+        if result.returncode == 1:
+            return 'infected', result.stdout.strip()
+        return 'error', (result.stderr or result.stdout).strip()
     
     def restrict_file(self, filepath):
         """Apply security restrictions to downloaded file"""
@@ -198,26 +958,9 @@ class SimpleMKVDownloader:
             if not downloaded_file:
                 return False
             
-            # Step 2: Basic validation
-            print("\n🔍 Performing basic file checks...")
-            valid, message = self.basic_file_check(downloaded_file)
-            print(f"Basic check: {message}")
-            if not valid:
+            if not self.validate_download(downloaded_file):
                 return False
             
-            # Step 3: Calculate hash
-            file_hash = self.calculate_hash(downloaded_file)
-            print(f"SHA256: {file_hash}")
-            print("💡 Tip: You can check this hash at virustotal.com")
-            
-            # Step 4: Basic security scan
-            if not self.basic_security_scan(downloaded_file):
-                print("❌ Security scan failed!")
-                return False
-            
-            # Step 5: Apply restrictions
-            self.restrict_file(downloaded_file)
-            
             print(f"\n✅ Download complete and secured!")
             print(f"📁 File location: {downloaded_file}")
             print(f"🔒 File is quarantined and read-only")
@@ -231,19 +974,217 @@ class SimpleMKVDownloader:
         except Exception as e:
             print(f"\n❌ Download failed: {e}")
             return False
+    
+    def validate_download(self, downloaded_file):
+        """Check, hash, scan and restrict a downloaded file; returns whether it passed"""
+        # Step 2: Basic validation
+        print("\n🔍 Performing basic file checks...")
+        valid, message = self.basic_file_check(downloaded_file)
+        print(f"Basic check: {message}")
+        if not valid:
+            self.cancel_scan()
+            return False
+        
+        # Step 3: Calculate hash
+        # Digests were computed during the download; only hash again if that was not possible
+        if not self.file_digests:
+            self.file_digests = {'sha256': self.calculate_hash(downloaded_file)}
+        for name, value in self.file_digests.items():
+            print(f"{name.upper()}: {value}")
+        print("💡 Tip: You can check this hash at virustotal.com")
+        
+        # Step 4: Basic security scan
+        if not self.basic_security_scan(downloaded_file):
+            print("❌ Security scan failed!")
+            return False
+        
+        # Step 5: Apply restrictions
+        self.restrict_file(downloaded_file)
+        return True
+
+def find_clamd():
+    """Address of a running clamd: a Unix socket path or (host, port), else None"""
+    for path in CLAMD_SOCKETS:
+        if os.path.exists(path):
+            return path
+    try:
+        with socket.create_connection(('127.0.0.1', CLAMD_PORT), timeout=0.2):
+            return ('127.0.0.1', CLAMD_PORT)
+    except OSError:
+        return None
+
+def parse_clamd_address(value):
+    """--clamd value: 'host:port' for TCP, anything else is a Unix socket path"""
+    host, sep, port = value.rpartition(':')
+    if sep and port.isdigit() and '/' not in value:
+        return (host or '127.0.0.1', int(port))
+    return value
+
+_verdict_lock = threading.Lock()
+
+def load_verdict(sha256, engine):
+    """Cached scan verdict for a file hash under this engine version, or None"""
+    with _verdict_lock:
+        try:
+            cache = json.loads(SCAN_CACHE.read_text())
+        except (OSError, ValueError):
+            return None
+    entry = cache.get(sha256)
+    if entry and entry.get('engine') == engine:
+        return entry
+    return None
+
+def store_verdict(sha256, engine, verdict, signature):
+    with _verdict_lock:
+        try:
+            cache = json.loads(SCAN_CACHE.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache[sha256] = {'engine': engine, 'verdict': verdict, 'signature': signature,
+                         'scanned_at': int(time.time())}
+        try:
+            SCAN_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = SCAN_CACHE.with_name(SCAN_CACHE.name + '.tmp')
+            tmp_path.write_text(json.dumps(cache))
+            os.replace(tmp_path, SCAN_CACHE)
+        except OSError as e:
+            print(f"⚠️  Could not save scan verdict: {e}")
+
+def read_url_list(source):
+    """URLs from a list file ('-' for stdin), one per line; blank lines and # comments are skipped"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(source).read_text().splitlines()
+    urls = [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+    return list(dict.fromkeys(urls))
+
+async def download_queue(urls, output_dir=None, connections=8, resume=True, digests=('sha256',),
+                         jobs=4, per_host=2, validate_workers=2, clamd=None):
+    """Download many URLs concurrently and validate each one as soon as it lands
+    
+    At most `jobs` downloads run at once, and at most `per_host` against any one host.
+    These limit downloads, not sockets: each download may open up to `connections` range
+    connections, so up to jobs * connections in total. Every host gets one keep-alive
+    session shared by its downloads. Validation runs on its own pool of `validate_workers`
+    threads, so it never holds up the next download. Returns the summary dict.
+    """
+    loop = asyncio.get_running_loop()
+    clamd = clamd if clamd is not None else (find_clamd() or '')
+    download_pool = ThreadPoolExecutor(max_workers=jobs)
+    validate_pool = ThreadPoolExecutor(max_workers=validate_workers)
+    global_slots = asyncio.Semaphore(jobs)
+    host_slots = {}
+    target_locks = {}
+    sessions = {}
+    
+    async def run(url):
+        host = urlparse(url).netloc
+        if host not in sessions:
+            sessions[host] = make_session(per_host * connections)
+            host_slots[host] = asyncio.Semaphore(per_host)
+        downloader = SimpleMKVDownloader(output_dir, connections, resume, digests, session=sessions[host], clamd=clamd)
+        downloader.show_progress = False
+        entry = {'url': url, 'file': None, 'bytes': 0, 'seconds': 0.0, 'mb_per_s': 0.0,
+                 'digests': None, 'valid': False, 'error': None}
+        
+        # URLs that map to the same file name would share a .part file; run those one at a time
+        target = downloader.target_path(url)
+        async with target_locks.setdefault(target, asyncio.Lock()):
+            # Wait for the host first so a busy host does not tie up global slots
+            async with host_slots[host], global_slots:
+                started = time.time()
+                filepath = await loop.run_in_executor(download_pool, downloader.download_file, url)
+                entry['seconds'] = round(time.time() - started, 3)
+        
+        if filepath is None:
+            entry['error'] = 'download failed'
+            return entry
+        entry['file'] = str(filepath)
+        entry['bytes'] = filepath.stat().st_size
+        entry['mb_per_s'] = round(entry['bytes'] / (1024*1024) / max(entry['seconds'], 1e-3), 2)
+        
+        try:
+            entry['valid'] = await loop.run_in_executor(validate_pool, downloader.validate_download, filepath)
+            if not entry['valid']:
+                entry['error'] = 'validation failed'
+        except Exception as e:
+            entry['error'] = f'validation failed: {e}'
+        entry['digests'] = downloader.file_digests
+        return entry
+    
+    print(f"📋 Queue: {len(urls)} URLs, {jobs} at a time, {per_host} per host")
+    started = time.time()
+    try:
+        files = await asyncio.gather(*(run(url) for url in urls))
+    finally:
+        download_pool.shutdown()
+        validate_pool.shutdown()
+        for session in sessions.values():
+            session.close()
+    
+    elapsed = time.time() - started
+    total_bytes = sum(entry['bytes'] for entry in files)
+    return {
+        'files': files,
+        'succeeded': sum(1 for entry in files if entry['valid']),
+        'failed': sum(1 for entry in files if not entry['valid']),
+        'total_bytes': total_bytes,
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(total_bytes / (1024*1024) / max(elapsed, 1e-3), 2),
+    }
 
 def main():
     parser = argparse.ArgumentParser(description="Simple MKV Downloader with Basic Security")
-    parser.add_argument("url", help="Direct URL to download MKV file")
+    parser.add_argument("url", nargs="?", help="Direct URL to download MKV file")
+    parser.add_argument("--clamd", type=parse_clamd_address, default=None,
+                       help="clamd socket path or host:port to scan while downloading (default: auto-detect). "
+                            "clamd stops at its StreamMaxLength (25 MB by default), so with the default "
+                            "every real MKV is rejected by clamd and gets a full clamscan after the download, "
+                            "and scanning while downloading saves nothing; raise StreamMaxLength in "
+                            "clamd.conf above your largest file")
+    parser.add_argument("-i", "--input-list", default=None,
+                       help="Queue mode: file with one URL per line ('-' reads stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=4,
+                       help="Queue mode: downloads running at once (default: 4); each may use up to "
+                            "--connections connections, so up to jobs x connections sockets in total")
+    parser.add_argument("--per-host", type=int, default=2,
+                       help="Queue mode: downloads running at once against one host (default: 2)")
+    parser.add_argument("--validate-workers", type=int, default=2,
+                       help="Queue mode: threads checking and scanning finished files (default: 2)")
+    parser.add_argument("--summary", default=None,
+                       help="Queue mode: summary JSON path (default: queue_summary.json in the output directory)")
     parser.add_argument("-o", "--output", default=None, 
                        help="Output directory (default: ~/Downloads)")
+    parser.add_argument("-c", "--connections", type=int, default=8,
+                       help="Parallel connections for servers that support ranges (default: 8, 1 = single stream)")
+    parser.add_argument("--digest", action="append", default=[],
+                       choices=sorted(name for name in hashlib.algorithms_guaranteed if not name.startswith('shake')),
+                       help="Extra digest to compute while downloading (repeatable; SHA256 is always computed)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                       help="Start over instead of resuming an interrupted download")
     
     args = parser.parse_args()
+    if not args.url and not args.input_list:
+        parser.error("give a URL or --input-list")
     
     print("📥 Simple MKV Downloader")
     print("=" * 30)
     
-    downloader = SimpleMKVDownloader(args.output)
+    if args.input_list:
+        summary = asyncio.run(download_queue(
+            read_url_list(args.input_list), args.output, args.connections, args.resume, args.digest,
+            max(1, args.jobs), max(1, args.per_host), max(1, args.validate_workers), args.clamd))
+        output_dir = Path(args.output) if args.output else Path.home() / "Downloads"
+        summary_path = Path(args.summary) if args.summary else output_dir / "queue_summary.json"
+        summary_path.write_text(json.dumps(summary, indent=2))
+        
+        print(f"\n📊 {summary['succeeded']} succeeded, {summary['failed']} failed, "
+              f"{summary['total_bytes'] / (1024*1024):.1f}MB at {summary['mb_per_s']:.1f} MB/s")
+        print(f"📝 Summary: {summary_path}")
+        sys.exit(0 if not summary['failed'] else 1)
+    
+    downloader = SimpleMKVDownloader(args.output, args.connections, args.resume, args.digest, clamd=args.clamd)
     success = downloader.process_download(args.url)
     
     if success:
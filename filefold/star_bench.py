@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Enhancer Benchmark Suite - Reproducible throughput, memory and per-stage timings
+
+Generates synthetic clips locally (noise, gradients, moving shapes, synthetic faces),
+runs UltimateVideoEnhancer at every enhancement level and grading style plus the fast
+and colorful enhancers, and writes the results to a JSON baseline. Compare mode runs
+the suite again (or loads a second result file) and flags regressions.
+"""
+
+import cv2
+import numpy as np
+import os
+import sys
+import json
+import time
+import platform
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count, get_context
+from typing import List, Tuple, Optional, Dict, Any
+
+from star import UltimateVideoEnhancer, ProcessingConfig, EnhancementLevel, ColorGradingStyle, peak_rss_mb
+from star_fast import FastVideoEnhancer
+from star_colorful import ColorfulVideoEnhancer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCH_VERSION = 2  # 2: peak_worker_rss_mb is reported by the enhancer's own workers
+
+CONTENTS = ('noise', 'gradient', 'shapes', 'faces')
+
+# Level and grading sweeps run on this clip; every clip gets the default settings
+SWEEP_CONTENT = 'shapes'
+DEFAULT_LEVEL = EnhancementLevel.CINEMATIC
+DEFAULT_GRADING = ColorGradingStyle.CINEMATIC
+SWEEP_LEVEL = EnhancementLevel.MEDIUM
+
+def synthetic_frame(content: str, index: int, width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Frame ``index`` of a deterministic synthetic clip"""
+    
+    if content == 'noise':
+        # Mid-grey with heavy sensor-like noise: worst case for denoising and compression
+        frame = rng.normal(128, 40, (height, width, 3))
+        return np.clip(frame, 0, 255).astype(np.uint8)
+    
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    phase = index / 24.0
+    
+    if content == 'gradient':
+        # Slowly drifting smooth ramps: banding and tone mapping
+        b = 255 * xx / width
+        g = 255 * yy / height
+        r = 127.5 * (1 + np.sin(2 * np.pi * (xx + yy) / (width + height) + phase))
+        return np.dstack([b, g, r]).astype(np.uint8)
+    
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = (40, 60, 80)
+    frame[:, :, 0] = (40 + 60 * yy / height).astype(np.uint8)
+    
+    if content == 'shapes':
+        # Hard-edged shapes moving at different speeds: sharpening and motion
+        scale = min(width, height)
+        for k in range(6):
+            cx = int((width * (0.1 + 0.15 * k) + index * (k + 1) * width / 120) % width)
+            cy = int(height * (0.3 + 0.4 * ((k * 37) % 10) / 10))
+            color = tuple(int(c) for c in ((k * 50) % 256, (k * 90 + 80) % 256, (k * 130 + 40) % 256))
+            if k % 2:
+                cv2.circle(frame, (cx, cy), max(2, scale // 10), color, -1, cv2.LINE_AA)
+            else:
+                half = max(2, scale // 12)
+                cv2.rectangle(frame, (cx - half, cy - half), (cx + half, cy + half), color, -1)
+        cv2.putText(frame, f'{index:04d}', (width // 20, height // 8), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale / 300, (255, 255, 255), max(1, scale // 200), cv2.LINE_AA)
+        return frame
+    
+    if content == 'faces':
+        # Cartoon faces drifting across the frame: face detection, tracking and skin smoothing
+        size = min(width, height) // 3
+        for k, x_start in enumerate((0.25, 0.7)):
+            cx = int(width * x_start + size * 0.3 * np.sin(phase + k))
+            cy = int(height * 0.5)
+            cv2.ellipse(frame, (cx, cy), (int(size * 0.4), int(size * 0.52)), 0, 0, 360, (150, 180, 225), -1, cv2.LINE_AA)
+            eye_dy, eye_dx = int(size * 0.1), int(size * 0.15)
+            for side in (-1, 1):
+                cv2.ellipse(frame, (cx + side * eye_dx, cy - eye_dy), (max(1, size // 14), max(1, size // 24)),
+                            0, 0, 360, (40, 30, 30), -1, cv2.LINE_AA)
+                cv2.line(frame, (cx + side * eye_dx - size // 12, cy - eye_dy - size // 10),
+                         (cx + side * eye_dx + size // 12, cy - eye_dy - size // 10), (50, 60, 80), max(1, size // 40))
+            cv2.line(frame, (cx, cy - size // 20), (cx - size // 30, cy + size // 10), (120, 140, 190), max(1, size // 60))
+            cv2.ellipse(frame, (cx, cy + int(size * 0.25)), (size // 8, size // 25), 0, 0, 360, (80, 80, 170), -1, cv2.LINE_AA)
+        return frame
+    
+    raise ValueError(f"Unknown synthetic content: {content}")
+
+def generate_clip(path: Path, content: str, width: int, height: int, frames: int, fps: int, seed: int) -> Path:
+    """Write a synthetic clip once; later runs reuse the file"""
+    
+    if path.exists():
+        return path
+    
+    rng = np.random.default_rng(seed)
+    temp_path = path.with_suffix('.part.mp4')
+    writer = cv2.VideoWriter(str(temp_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write synthetic clip: {temp_path}")
+    try:
+        for index in range(frames):
+            writer.write(synthetic_frame(content, index, width, height, rng))
+    finally:
+        writer.release()
+    os.replace(temp_path, path)
+    return path
+
+def build_cases(resolutions: List[Tuple[int, int]], contents: List[str]) -> List[Dict[str, Any]]:
+    """Every content with the default settings, plus level and grading sweeps"""
+    
+    cases = {}
+    
+    def add(enhancer: str, content: str, width: int, height: int, level: Optional[EnhancementLevel] = None,
+            grading: Optional[ColorGradingStyle] = None):
+        parts = [enhancer] + ([level.value, grading.value] if level else []) + [content, f'{width}x{height}']
+        case_id = '/'.join(parts)
+        cases[case_id] = {
+            'id': case_id,
+            'enhancer': enhancer,
+            'content': content,
+            'width': width,
+            'height': height,
+            'level': level.value if level else None,
+            'grading': grading.value if grading else None
+        }
+    
+    for width, height in resolutions:
+        for content in contents:
+            add('ultimate', content, width, height, DEFAULT_LEVEL, DEFAULT_GRADING)
+            add('fast', content, width, height)
+            add('colorful', content, width, height)
+        if SWEEP_CONTENT in contents:
+            for level in EnhancementLevel:
+                add('ultimate', SWEEP_CONTENT, width, height, level, DEFAULT_GRADING)
+            for grading in ColorGradingStyle:
+                add('ultimate', SWEEP_CONTENT, width, height, SWEEP_LEVEL, grading)
+    
+    return list(cases.values())
+
+def run_case(case: Dict[str, Any], clip: str, work_dir: str, frames: int, fps: int, threads: int) -> Dict[str, Any]:
+    """Benchmark one case; runs in a fresh process so peak RSS belongs to this case alone"""
+    
+    # The fast and colorful enhancers write their temporary files to the working directory
+    os.chdir(work_dir)
+    output = str(Path(work_dir) / f"bench_{case['id'].replace('/', '_')}.mp4")
+    width, height = case['width'], case['height']
+    result = {'stages': {}, 'peak_worker_rss_mb': None}
+    
+    start = time.perf_counter()
+    if case['enhancer'] == 'ultimate':
+        config = ProcessingConfig(target_width=width, target_height=height, target_fps=fps,
+                                  enhancement_level=EnhancementLevel(case['level']),
+                                  color_grading=ColorGradingStyle(case['grading']),
+                                  num_threads=threads, preset='veryfast', profile=True)
+        enhancer = UltimateVideoEnhancer(config)
+        try:
+            stats = enhancer.process_video_ultimate(clip, output)
+        finally:
+            enhancer.shutdown()
+        frames = stats['frames_processed']
+        # Pool workers are forkserver children, not ours, so they report their own peak
+        result['peak_worker_rss_mb'] = stats['peak_worker_rss_mb']
+        result['stages'] = {stage: {key: timing[key] for key in ('p50_ms', 'p95_ms', 'max_ms', 'share')}
+                            for stage, timing in stats['profile']['stages'].items()}
+    elif case['enhancer'] == 'fast':
+        FastVideoEnhancer(width, height, fps).process_video(clip, output)
+    else:
+        ColorfulVideoEnhancer(width, height, fps).process_video(clip, output)
+    seconds = time.perf_counter() - start
+    
+    for path in (Path(output), Path(output).with_suffix('.json')):
+        if path.exists():
+            path.unlink()
+    
+    result.update({
+        'frames': frames,
+        'seconds': seconds,
+        'fps': frames / seconds if seconds > 0 else 0,
+        'peak_rss_mb': peak_rss_mb()
+    })
+    return result
+
+def run_suite(args) -> Dict[str, Any]:
+    """Generate the clips, run every selected case and return the result document"""
+    
+    work_dir = Path(args.work_dir).resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+    resolutions = [tuple(int(v) for v in res.lower().split('x')) for res in args.resolutions.split(',')]
+    contents = args.contents.split(',')
+    
+    cases = build_cases(resolutions, contents)
+    if args.cases:
+        cases = [case for case in cases if any(pattern in case['id'] for pattern in args.cases.split(','))]
+    logger.info(f"🧪 {len(cases)} benchmark cases, {args.frames} frames each, {args.threads} threads")
+    
+    results = {}
+    spawn = get_context('spawn')
+    for number, case in enumerate(cases, 1):
+        clip = generate_clip(work_dir / f"{case['content']}_{case['width']}x{case['height']}_{args.frames}f.mp4",
+                             case['content'], case['width'], case['height'], args.frames, args.fps, args.seed)
+        
+        # One short-lived process per case keeps peak RSS and worker pools from leaking between cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            try:
+                result = pool.submit(run_case, case, str(clip), str(work_dir), args.frames, args.fps,
+                                     args.threads).result()
+            except Exception as e:
+                logger.error(f"❌ {case['id']} failed: {e}")
+                result = {'error': str(e)}
+        
+        results[case['id']] = {**case, **result}
+        if 'error' not in result:
+            logger.info(f"⏱️ [{number}/{len(cases)}] {case['id']}: {result['fps']:.2f} fps, "
+                        f"peak RSS {result['peak_rss_mb']:.0f} MB, workers {result['peak_worker_rss_mb'] or 0:.0f} MB")
+    
+    return {
+        'bench_version': BENCH_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': cpu_count(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__
+        },
+        'settings': {
+            'frames': args.frames,
+            'fps': args.fps,
+            'threads': args.threads,
+            'seed': args.seed,
+            'resolutions': args.resolutions,
+            'contents': args.contents
+        },
+        'cases': results
+    }
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+                    min_stage_ms: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline`` beyond ``threshold`` (a fraction)"""
+    
+    # Before version 2 the worker figure was the RSS of whatever child the benchmark waited on
+    compare_workers = baseline.get('bench_version', 1) >= 2 and current.get('bench_version', 1) >= 2
+    
+    regressions = []
+    for case_id, old in baseline['cases'].items():
+        new = current['cases'].get(case_id)
+        if new is None or 'error' in old:
+            continue
+        if 'error' in new:
+            regressions.append(f"{case_id}: failed ({new['error']})")
+            continue
+        
+        if new['fps'] < old['fps'] * (1 - threshold):
+            regressions.append(f"{case_id}: fps {old['fps']:.2f} -> {new['fps']:.2f} "
+                               f"({new['fps'] / old['fps'] - 1:+.0%})")
+        if new['peak_rss_mb'] > old['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{case_id}: peak RSS {old['peak_rss_mb']:.0f} -> {new['peak_rss_mb']:.0f} MB "
+                               f"({new['peak_rss_mb'] / old['peak_rss_mb'] - 1:+.0%})")
+        old_workers, new_workers = old.get('peak_worker_rss_mb'), new.get('peak_worker_rss_mb')
+        if compare_workers and old_workers and new_workers and new_workers > old_workers * (1 + threshold):
+            regressions.append(f"{case_id}: peak worker RSS {old_workers:.0f} -> {new_workers:.0f} MB "
+                               f"({new_workers / old_workers - 1:+.0%})")
+        
+        # Stages this short are mostly timer noise
+        for stage, old_timing in old.get('stages', {}).items():
+            new_timing = new.get('stages', {}).get(stage)
+            if new_timing is None or old_timing['p50_ms'] < min_stage_ms:
+                continue
+            if new_timing['p50_ms'] > old_timing['p50_ms'] * (1 + threshold):
+                regressions.append(f"{case_id}: {stage} p50 {old_timing['p50_ms']:.1f} -> "
+                                   f"{new_timing['p50_ms']:.1f} ms ({new_timing['p50_ms'] / old_timing['p50_ms'] - 1:+.0%})")
+    
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhancer Benchmark Suite")
+    parser.add_argument("-o", "--output", default="bench_baseline.json", help="Where to write the results")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--against", default=None,
+                       help="With --compare: compare this existing result file instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                       help="Relative change counted as a regression (default: 0.10 = 10%%)")
+    parser.add_argument("--min-stage-ms", type=float, default=1.0, help="Ignore stages faster than this in the baseline")
+    parser.add_argument("--resolutions", default="320x180,640x360", help="Comma-separated WxH list")
+    parser.add_argument("--contents", default=','.join(CONTENTS), help="Comma-separated synthetic clip types")
+    parser.add_argument("--cases", default=None, help="Only run cases whose id contains one of these comma-separated strings")
+    parser.add_argument("--frames", type=int, default=24, help="Frames per synthetic clip")
+    parser.add_argument("--fps", type=int, default=24, help="Frame rate of the synthetic clips")
+    parser.add_argument("--threads", type=int, default=min(4, cpu_count()), help="Worker processes for the ultimate enhancer")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for the synthetic clips")
+    parser.add_argument("--work-dir", default="bench_clips", help="Directory for synthetic clips and scratch outputs")
+    
+    args = parser.parse_args()
+    
+    print("🧪 Enhancer Benchmark Suite")
+    print("=" * 30)
+    
+    if args.against:
+        if not args.compare:
+            parser.error("--against needs --compare")
+        with open(args.against) as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        logger.info(f"💾 Results written to {args.output}")
+    
+    if not args.compare:
+        return
+    
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != current.get('machine'):
+        logger.warning("⚠️ Baseline was recorded on a different machine or software stack")
+    
+    regressions = compare_results(baseline, current, args.threshold, args.min_stage_ms)
+    if regressions:
+        logger.error(f"📉 {len(regressions)} regressions beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            logger.error(f"   {regression}")
+        sys.exit(1)
+    
+    logger.info(f"✅ No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Scanning through clamd's INSTREAM protocol, against a local stand-in daemon"""
+
+import os
+import shutil
+import socketserver
+import struct
+import tempfile
+import threading
+
+import pytest
+
+import a
+
+LIMIT = 256 * 1024  # Stand-in for clamd's StreamMaxLength
+SIGNATURE = b'EICAR-STANDARD'
+
+
+class ClamdHandler(socketserver.BaseRequestHandler):
+    """Answers zVERSION and zINSTREAM the way clamd does"""
+
+    def read(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def handle(self):
+        command = b''
+        while not command.endswith(b'\0'):
+            command += self.read(1)
+        if command == b'zVERSION\0':
+            self.request.sendall(self.server.version + b'\0')
+            return
+
+        data = bytearray()
+        try:
+            while True:
+                size = struct.unpack('>I', self.read(4))[0]
+                if not size:
+                    break
+                data += self.read(size)
+                if len(data) > LIMIT:
+                    self.request.sendall(b'INSTREAM size limit exceeded. ERROR\0')
+                    return
+        except EOFError:
+            return
+        self.server.scanned.append(bytes(data))
+        if SIGNATURE in data:
+            self.request.sendall(b'stream: Eicar-Test-Signature FOUND\0')
+        else:
+            self.request.sendall(b'stream: OK\0')
+
+
+@pytest.fixture
+def clamd():
+    # Unix socket paths are limited to ~100 bytes, too short for pytest's tmp_path
+    directory = tempfile.mkdtemp(prefix='clamd')
+    server = socketserver.ThreadingUnixStreamServer(os.path.join(directory, 'clamd.sock'), ClamdHandler)
+    server.daemon_threads = True
+    server.scanned = []
+    server.version = b'ClamAV 1.0.0/27000/Stand-in'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def fake_clamscan(tmp_path, monkeypatch):
+    """Put a clamscan on PATH that exits with the given status, or none at all"""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    monkeypatch.setenv('PATH', str(bin_dir))
+
+    def install(status, output=''):
+        script = bin_dir / 'clamscan'
+        script.write_text(f"#!/bin/sh\necho '{output}'\nexit {status}\n")
+        script.chmod(0o755)
+
+    return install
+
+
+@pytest.fixture
+def downloader(tmp_path, clamd, monkeypatch):
+    monkeypatch.setattr(a, 'SCAN_CACHE', tmp_path / 'scan_verdicts.json')
+    downloader = a.SimpleMKVDownloader(tmp_path / 'out', clamd=clamd.server_address)
+    downloader.show_progress = False
+    return downloader
+
+
+def write_file(tmp_path, size, infected=False):
+    data = bytearray(os.urandom(size))
+    if infected:
+        data[size // 2:size // 2 + len(SIGNATURE)] = SIGNATURE
+    path = tmp_path / 'video.mkv'
+    path.write_bytes(bytes(data))
+    return path
+
+
+def test_clean_stream(downloader, clamd, tmp_path):
+    path = write_file(tmp_path, LIMIT // 2)
+
+    assert downloader.clamav_scan(path) == ('clean', None)
+    assert clamd.scanned == [path.read_bytes()]
+
+
+def test_stream_fed_during_download(downloader, clamd, tmp_path):
+    path = write_file(tmp_path, LIMIT // 2)
+    data = path.read_bytes()
+
+    downloader.pending_scan = downloader.open_scan()
+    for offset in range(0, len(data), 10000):
+        downloader.pending_scan.feed(data[offset:offset + 10000])
+
+    assert downloader.clamav_scan(path) == ('clean', None)
+    assert clamd.scanned == [data]
+
+
+def test_infected_stream(downloader, tmp_path):
+    path = write_file(tmp_path, LIMIT // 2, infected=True)
+
+    assert downloader.clamav_scan(path) == ('infected', 'Eicar-Test-Signature')
+    assert downloader.basic_security_scan(path) is False
+
+
+@pytest.mark.parametrize('status, verdict', [(0, 'clean'), (1, 'infected')])
+def test_size_limit_falls_back_to_clamscan(downloader, fake_clamscan, tmp_path, status, verdict):
+    fake_clamscan(status, f'{tmp_path}/video.mkv: Eicar-Test-Signature FOUND' if status else '')
+    path = write_file(tmp_path, 2 * LIMIT, infected=True)
+
+    assert downloader.clamav_scan(path)[0] == verdict
+
+
+def test_size_limit_without_clamscan_says_to_raise_stream_max_length(downloader, fake_clamscan, tmp_path, capsys):
+    path = write_file(tmp_path, 2 * LIMIT)
+
+    verdict, detail = downloader.clamav_scan(path)
+
+    assert verdict == 'error'
+    assert 'StreamMaxLength' in detail
+    assert downloader.basic_security_scan(path) is True
+    assert 'raise StreamMaxLength' in capsys.readouterr().out
+
+
+def test_verdict_cache_hit_and_engine_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(a, 'SCAN_CACHE', tmp_path / 'cache' / 'scan_verdicts.json')
+    assert a.load_verdict('ab' * 32, 'engine 1') is None
+
+    a.store_verdict('ab' * 32, 'engine 1', 'infected', 'Eicar-Test-Signature')
+
+    assert a.load_verdict('ab' * 32, 'engine 1')['signature'] == 'Eicar-Test-Signature'
+    assert a.load_verdict('ab' * 32, 'engine 2') is None
+    assert a.load_verdict('cd' * 32, 'engine 1') is None
+
+
+def test_cached_verdict_skips_the_rescan(clamd, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(a, 'SCAN_CACHE', tmp_path / 'scan_verdicts.json')
+    path = write_file(tmp_path, LIMIT // 2)
+
+    def scan():
+        downloader = a.SimpleMKVDownloader(tmp_path / 'out', clamd=clamd.server_address)
+        return downloader.basic_security_scan(path)
+
+    assert scan() is True
+    assert len(clamd.scanned) == 1
+
+    assert scan() is True
+    assert len(clamd.scanned) == 1
+    assert 'verdict cached' in capsys.readouterr().out
+
+    # New signatures can flag a file the old ones passed
+    clamd.version = b'ClamAV 1.0.0/27001/Stand-in'
+    assert scan() is True
+    assert len(clamd.scanned) == 2
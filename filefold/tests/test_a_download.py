@@ -0,0 +1,293 @@
+"""Ranged, resumed and single-stream downloads against a local HTTP server"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import a
+
+PART = 64 * 1024
+DATA = os.urandom(6 * PART + 1234)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        server = self.server
+        start, end, status = 0, len(server.data) - 1, 200
+        requested = self.headers.get('Range') if server.ranges else None
+        if requested and self.headers.get('If-Range') not in (None, server.etag):
+            requested = None
+        if requested:
+            first, _, last = requested[len('bytes='):].partition('-')
+            start, end, status = int(first), min(int(last or end), end), 206
+            if server.misplaced_ranges:
+                # Always answer from the top of the file, whatever was asked for
+                end, start = end - start, 0
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/x-matroska')
+        self.send_header('Content-Length', str(end + 1 - start))
+        if server.advertise_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(server.data)}')
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        if not send_body:
+            return
+
+        # Truncation is keyed by the range end, which stays the same when a part is retried
+        with server.lock:
+            server.requests.append(start if status == 206 else None)
+            cut = server.truncate.get(end, 0) if status == 206 else 0
+            if cut:
+                server.truncate[end] = cut - 1
+        body = server.data[start:end + 1]
+        if cut:
+            # Promise the whole range, send half of it and hang up
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class RangeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data, ranges=True, advertise_ranges=None):
+        super().__init__(('127.0.0.1', 0), RangeHandler)
+        self.data = data
+        self.ranges = ranges
+        self.advertise_ranges = ranges if advertise_ranges is None else advertise_ranges
+        self.etag = '"v1"'
+        self.misplaced_ranges = False
+        self.truncate = {}  # range end -> responses still to cut short
+        self.requests = []  # range start of each GET, None for whole-file responses
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/video.mkv'
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(data=DATA, **options):
+        server = RangeServer(data, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    """Split the test file into a handful of parts and read it in several chunks each"""
+    monkeypatch.setattr(a, 'PART_SIZE', PART)
+    monkeypatch.setattr(a, 'MIN_PARALLEL_SIZE', 2 * PART)
+    monkeypatch.setattr(a, 'CHUNK_SIZE', 8 * 1024)
+
+
+def make_downloader(tmp_path, resume=True):
+    downloader = a.SimpleMKVDownloader(tmp_path, connections=4, resume=resume, clamd='')
+    downloader.show_progress = False
+    return downloader
+
+
+def part_starts(count=None):
+    return list(range(0, len(DATA), PART))[:count]
+
+
+def test_ranged_download_matches_the_source(serve, tmp_path):
+    server = serve()
+    downloader = make_downloader(tmp_path)
+
+    path = downloader.download_file(server.url)
+
+    assert path.read_bytes() == DATA
+    assert sorted(server.requests) == part_starts()
+    assert downloader.file_digests['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert not path.with_name(path.name + '.part').exists()
+    assert not path.with_name(path.name + '.part.json').exists()
+
+
+def test_truncated_part_is_retried_from_where_it_stopped(serve, tmp_path):
+    server = serve()
+    server.truncate = {3 * PART - 1: 2}
+    downloader = make_downloader(tmp_path)
+
+    path = downloader.download_file(server.url)
+
+    assert path.read_bytes() == DATA
+    assert downloader.file_digests['sha256'] == hashlib.sha256(DATA).hexdigest()
+    retries = [start for start in server.requests if start not in part_starts()]
+    assert len(retries) == 2
+    assert all(2 * PART < start < 3 * PART for start in retries)
+
+
+def test_resume_verifies_parts_and_fetches_only_what_is_missing(serve, tmp_path):
+    server = serve()
+    last_start = part_starts()[-1]
+    server.truncate = {len(DATA) - 1: a.PART_RETRIES}
+
+    assert make_downloader(tmp_path).download_file(server.url) is None
+    partial = tmp_path / 'video.mkv.part'
+    with open(tmp_path / 'video.mkv.part.json') as f:
+        completed = sorted(record['start'] for record in json.load(f)['completed'])
+    assert completed == part_starts(-1)
+
+    # Damage one finished part on disk; verification has to catch it
+    with open(partial, 'r+b') as f:
+        f.seek(2 * PART + 100)
+        f.write(bytes([DATA[2 * PART + 100] ^ 0xFF]))
+    server.requests.clear()
+
+    downloader = make_downloader(tmp_path)
+    path = downloader.download_file(server.url)
+
+    assert path.read_bytes() == DATA
+    assert sorted(server.requests) == [2 * PART, last_start]
+    assert downloader.file_digests['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert not partial.exists()
+
+
+def test_resume_starts_over_when_the_file_changed(serve, tmp_path):
+    server = serve()
+    server.truncate = {len(DATA) - 1: a.PART_RETRIES}
+    assert make_downloader(tmp_path).download_file(server.url) is None
+
+    changed = bytes(reversed(DATA))
+    server.data, server.etag = changed, '"v2"'
+    server.requests.clear()
+
+    path = make_downloader(tmp_path).download_file(server.url)
+
+    assert path.read_bytes() == changed
+    assert sorted(server.requests) == part_starts()
+
+
+@pytest.mark.parametrize('advertise_ranges', [False, True], ids=['no-ranges', 'ranges-ignored'])
+def test_server_without_ranges_falls_back_to_a_single_stream(serve, tmp_path, advertise_ranges):
+    server = serve(ranges=False, advertise_ranges=advertise_ranges)
+    downloader = make_downloader(tmp_path)
+
+    path = downloader.download_file(server.url)
+
+    assert path.read_bytes() == DATA
+    assert set(server.requests) == {None}
+    assert downloader.file_digests['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert not path.with_name(path.name + '.part.json').exists()
+
+
+def test_range_answered_from_the_wrong_offset_falls_back_to_a_single_stream(serve, tmp_path):
+    server = serve()
+    server.misplaced_ranges = True
+    downloader = make_downloader(tmp_path)
+
+    path = downloader.download_file(server.url)
+
+    assert path.read_bytes() == DATA
+    assert None in server.requests
+    assert downloader.file_digests['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def track_downloads(monkeypatch, tmp_path):
+    """Count downloads running at once overall, per host and per target file"""
+    monkeypatch.setattr(a, 'SCAN_CACHE', tmp_path / 'scan_verdicts.json')
+    download_file = a.SimpleMKVDownloader.download_file
+    lock = threading.Lock()
+    active, peak = {}, {}
+
+    def tracked(self, url, custom_headers=None):
+        keys = ('all', a.urlparse(url).netloc, self.target_path(url))
+        with lock:
+            for key in keys:
+                active[key] = active.get(key, 0) + 1
+                peak[key] = max(peak.get(key, 0), active[key])
+        try:
+            time.sleep(0.2)  # Long enough for every allowed download to overlap
+            return download_file(self, url, custom_headers)
+        finally:
+            with lock:
+                for key in keys:
+                    active[key] -= 1
+
+    monkeypatch.setattr(a.SimpleMKVDownloader, 'download_file', tracked)
+    return peak
+
+
+def server_url(server, name):
+    return f'http://127.0.0.1:{server.server_address[1]}/{name}'
+
+
+def test_queue_holds_downloads_to_the_host_and_global_limits(serve, tmp_path, track_downloads):
+    servers = [serve(), serve()]
+    urls = [server_url(server, f'video{index}.mkv') for server in servers for index in range(3)]
+
+    summary = asyncio.run(a.download_queue(urls, tmp_path, connections=2, jobs=3, per_host=2, clamd=''))
+
+    assert summary['succeeded'] == len(urls)
+    assert track_downloads['all'] == 3
+    assert [track_downloads[a.urlparse(server_url(server, '')).netloc] for server in servers] == [2, 2]
+    assert all(Path(entry['file']).read_bytes() == DATA for entry in summary['files'])
+
+
+def test_queue_runs_downloads_of_the_same_file_one_at_a_time(serve, tmp_path, track_downloads):
+    servers = [serve(), serve()]
+
+    summary = asyncio.run(a.download_queue([server.url for server in servers], tmp_path, jobs=4, clamd=''))
+
+    assert summary['succeeded'] == 2
+    assert track_downloads[tmp_path / 'video.mkv'] == 1
+    assert (tmp_path / 'video.mkv').read_bytes() == DATA
+    assert not (tmp_path / 'video.mkv.part').exists()
+
+
+def test_queue_writes_the_summary_json(serve, tmp_path, track_downloads, monkeypatch):
+    server = serve()
+    # Nothing listens on a port the closed server just gave up
+    closed = RangeServer(DATA)
+    closed.server_close()
+    url_list = tmp_path / 'urls.txt'
+    url_list.write_text(f'# queue\n{server.url}\n\n{server_url(closed, "gone.mkv")}\n')
+    summary_path = tmp_path / 'summary.json'
+    monkeypatch.setattr(a, 'find_clamd', lambda: None)
+    monkeypatch.setattr(sys, 'argv', ['a.py', '-i', str(url_list), '-o', str(tmp_path / 'out'),
+                                      '--summary', str(summary_path)])
+
+    with pytest.raises(SystemExit) as exit_info:
+        a.main()
+
+    assert exit_info.value.code == 1
+    summary = json.loads(summary_path.read_text())
+    assert (summary['succeeded'], summary['failed'], summary['total_bytes']) == (1, 1, len(DATA))
+    done, failed = summary['files']
+    assert (done['url'], done['valid'], done['bytes']) == (server.url, True, len(DATA))
+    assert done['digests']['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert (failed['valid'], failed['error']) == (False, 'download failed')
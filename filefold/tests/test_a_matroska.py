@@ -0,0 +1,101 @@
+"""MatroskaValidator against small hand-built EBML files"""
+
+import pytest
+
+import a
+
+V = a.MatroskaValidator
+SIMPLE_BLOCK = 0xA3
+CUE_POINT = 0xBB
+UNKNOWN_SIZE = b'\x01\xff\xff\xff\xff\xff\xff\xff'
+
+
+def element(element_id, *children, unknown=False):
+    """One element with an 8-byte size field (or the unknown-size marker)"""
+    data = b''.join(children)
+    size = UNKNOWN_SIZE if unknown else (len(data) | 1 << 56).to_bytes(8, 'big')
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + size + data
+
+
+def uint(element_id, value):
+    return element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big'))
+
+
+def header(doc_type=b'matroska'):
+    return element(V.EBML, element(V.DOC_TYPE, doc_type))
+
+
+def tracks():
+    entry = element(V.TRACK_ENTRY, uint(V.TRACK_NUMBER, 1), uint(V.TRACK_TYPE, 1),
+                    element(V.CODEC_ID, b'V_MPEG4/ISO/AVC'))
+    return element(V.TRACKS, entry)
+
+
+def cluster(timecode, unknown=False):
+    block = element(SIMPLE_BLOCK, b'\x81\x00\x00\x80' + bytes(range(200)))
+    return element(V.CLUSTER, uint(V.CLUSTER_TIMECODE, timecode), block, unknown=unknown)
+
+
+def cues():
+    return element(V.CUES, element(CUE_POINT, uint(0xB3, 0)))
+
+
+def matroska(*children, unknown=False):
+    return header() + element(V.SEGMENT, *children, unknown=unknown)
+
+
+def validate(data):
+    return V(data).validate()
+
+
+def test_well_formed_file():
+    summary = validate(matroska(tracks(), cluster(0), cluster(1000), cues()))
+
+    assert summary == "1 tracks (V_MPEG4/ISO/AVC), 2 clusters"
+
+
+def test_unknown_size_segment_and_cluster():
+    data = matroska(tracks(), cluster(0, unknown=True), cluster(1000, unknown=True), cues(), unknown=True)
+
+    assert validate(data) == "1 tracks (V_MPEG4/ISO/AVC), 2 clusters"
+
+
+def test_truncated_segment():
+    data = matroska(tracks(), cluster(0), cluster(1000), cues())
+
+    with pytest.raises(a.MatroskaError, match="truncated: Segment needs"):
+        validate(data[:-50])
+
+
+def test_unknown_size_cluster_cut_mid_block():
+    data = matroska(tracks(), cluster(0, unknown=True), cluster(1000, unknown=True), unknown=True)
+
+    with pytest.raises(a.MatroskaError, match="truncated: cluster element"):
+        validate(data[:-100])
+
+
+def test_cluster_before_tracks():
+    with pytest.raises(a.MatroskaError, match="comes before any track headers"):
+        validate(matroska(cluster(0), tracks(), cues()))
+
+
+def test_timecodes_going_backwards():
+    with pytest.raises(a.MatroskaError, match=r"goes back in time \(500 < 1000\)"):
+        validate(matroska(tracks(), cluster(1000), cluster(500), cues()))
+
+
+def test_missing_cues_only_warns():
+    summary = validate(matroska(tracks(), cluster(0), cluster(1000)))
+
+    assert summary == "1 tracks (V_MPEG4/ISO/AVC), 2 clusters, no Cues (seeking will be slow)"
+
+
+def test_file_check_rejects_a_truncated_download(tmp_path):
+    path = tmp_path / 'video.mkv'
+    path.write_bytes(matroska(tracks(), cluster(0), cluster(1000), cues())[:-50])
+    downloader = a.SimpleMKVDownloader(tmp_path, clamd='')
+
+    ok, message = downloader.basic_file_check(path)
+
+    assert not ok
+    assert message.startswith("Broken Matroska file: truncated")
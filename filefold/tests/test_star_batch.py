@@ -0,0 +1,69 @@
+"""Batch jobs stay within their share of the CPU budget, and command line options"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+import star
+
+
+def test_job_threads_follow_the_job_cores():
+    config = star.ProcessingConfig(num_threads=2, cpu_cores=4, tile_size=64)
+    enhancer = star.UltimateVideoEnhancer(config)
+    try:
+        assert star.cores_per_worker(config) == 2
+        assert enhancer.post_processor.threads == 2
+        assert enhancer.face_tracker.threads == 2
+    finally:
+        enhancer.shutdown()
+
+    sink = star.FFmpegFrameSink('out.mp4', 64, 64, 24, config, threads=config.cpu_cores)
+    command = sink.build_command()
+    assert command[command.index('-threads') + 1] == '4'
+
+
+def test_run_job_hands_its_workers_to_the_enhancer(monkeypatch):
+    configs = []
+
+    class RecordingEnhancer:
+        def __init__(self, config):
+            configs.append(config)
+
+        def process_video_ultimate(self, input_path, output_path):
+            return {}
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(star, 'UltimateVideoEnhancer', RecordingEnhancer)
+    scheduler = star.BatchScheduler(star.ProcessingConfig(num_threads=8))
+    job = star.BatchJob(Path('in.mp4'), Path('out.mp4'), workers=3)
+
+    scheduler.run_job(job)
+
+    assert (configs[0].num_threads, configs[0].cpu_cores) == (3, 3)
+    assert star.cores_per_worker(configs[0]) == 1
+
+
+def test_batch_options_have_flags(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['star.py', 'videos', '-o', 'out', '--batch-order', 'frames',
+                                      '--batch-memory-mb', '4096'])
+
+    config = star.create_config_from_args()
+
+    assert (config.batch_order, config.batch_memory_mb, config.output) == ('frames', 4096, 'out')
+
+
+@pytest.mark.parametrize('value', ['-0.1', '1', '1.5', 'nan'])
+def test_hdr_smoothing_outside_zero_to_one_is_rejected(monkeypatch, value):
+    monkeypatch.setattr(sys, 'argv', ['star.py', 'in.mp4', '--hdr-smoothing', value])
+
+    with pytest.raises(SystemExit):
+        star.create_config_from_args()
+
+
+def test_hdr_smoothing_accepts_zero(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['star.py', 'in.mp4', '--hdr-smoothing', '0'])
+
+    assert star.create_config_from_args().hdr_smoothing == 0.0
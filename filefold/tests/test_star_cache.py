@@ -0,0 +1,146 @@
+"""ResultCache keys and eviction, and per-segment digests taken while streaming"""
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import star
+
+FRAMES = 12
+SEGMENT = 6
+SIZE = (160, 96)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    """Steadily brightening gradient, so HDR smoothing carries state from frame to frame"""
+    path = tmp_path / "ramp.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, SIZE)
+    gradient = np.tile(np.linspace(20, 200, SIZE[0], dtype=np.float32), (SIZE[1], 1))
+    for index in range(FRAMES):
+        frame = np.clip(gradient * (0.6 + 0.04 * index), 0, 255).astype(np.uint8)
+        writer.write(cv2.merge([frame, frame, frame]))
+    writer.release()
+    return path
+
+
+def make_config(**overrides):
+    settings = dict(target_width=SIZE[0], target_height=SIZE[1], batch_size=4, queue_depth=FRAMES + 4,
+                    num_threads=1, hdr_smoothing=0.8)
+    settings.update(overrides)
+    return star.ProcessingConfig(**settings)
+
+
+def decode(enhancer, clip, start=0, segment_digests=None):
+    """Run the decoder thread's body from ``start``; returns {idx: analysis}"""
+    cap = cv2.VideoCapture(str(clip))
+    for _ in range(start):
+        cap.grab()
+    ring = star.SharedFrameRing.create(FRAMES + 4, (SIZE[1], SIZE[0], 3), (SIZE[1], SIZE[0], 3))
+    free_slots = queue.Queue()
+    for slot in range(ring.slots):
+        free_slots.put(slot)
+    batches = queue.Queue()
+    try:
+        enhancer.reset_temporal_state()
+        enhancer._decode_batches(cap, ring, free_slots, batches, threading.Event(), start,
+                                 segment_digests=segment_digests)
+        analyses = {}
+        while True:
+            batch = batches.get_nowait()
+            if batch is None:
+                return analyses
+            analyses.update((frame_idx, analysis) for frame_idx, _, analysis in batch)
+    finally:
+        cap.release()
+        ring.close()
+        ring.unlink()
+
+
+def add_entry(cache, key, size, age, metadata=None):
+    source = cache.directory / 'source.bin'
+    source.write_bytes(b'x' * size)
+    cache.put(key, source, metadata or {'frames': 1})
+    source.unlink()
+    stamp = time.time() - age
+    os.utime(cache.directory / f'{key}.mp4', (stamp, stamp))
+
+
+def test_keys_follow_inputs_settings_and_pipeline_version(monkeypatch):
+    config = make_config()
+    video = star.ResultCache.video_key('a' * 64, config)
+    segment = star.ResultCache.segment_key('a' * 64, 24.0, config)
+
+    assert video == star.ResultCache.video_key('a' * 64, make_config())
+    assert segment == star.ResultCache.segment_key('a' * 64, 24.0, make_config())
+    assert video != segment
+    assert video != star.ResultCache.video_key('b' * 64, config)
+    assert segment != star.ResultCache.segment_key('b' * 64, 24.0, config)
+    assert segment != star.ResultCache.segment_key('a' * 64, 25.0, config)
+    assert segment != star.ResultCache.segment_key('a' * 64, 24.0, make_config(hdr_smoothing=0.5))
+
+    # Runtime-only settings do not change what comes out
+    assert segment == star.ResultCache.segment_key('a' * 64, 24.0, make_config(num_threads=4))
+
+    monkeypatch.setattr(star, 'PIPELINE_VERSION', star.PIPELINE_VERSION + 1)
+    assert video != star.ResultCache.video_key('a' * 64, config)
+
+
+def test_get_returns_what_put_stored(tmp_path):
+    cache = star.ResultCache(str(tmp_path / 'cache'), max_mb=10)
+    add_entry(cache, 'k1', 100, age=0, metadata={'frames': 7})
+
+    assert cache.get('k1', tmp_path / 'out.mp4') == {'frames': 7}
+    assert (tmp_path / 'out.mp4').read_bytes() == b'x' * 100
+    assert cache.get('missing', tmp_path / 'other.mp4') is None
+    assert not (tmp_path / 'other.mp4').exists()
+
+
+def test_evict_drops_the_least_recently_used_entries(tmp_path):
+    cache = star.ResultCache(str(tmp_path / 'cache'), max_mb=10)
+    for key, age in (('old', 300), ('middle', 200), ('new', 100)):
+        add_entry(cache, key, 1000, age)
+
+    # A hit counts as a use
+    cache.get('old', tmp_path / 'out.mp4')
+    cache.max_bytes = 2500
+    cache.evict()
+
+    assert sorted(path.stem for path in cache.directory.glob('*.mp4')) == ['new', 'old']
+    assert not (cache.directory / 'middle.json').exists()
+
+
+def test_has_segments_only_for_the_same_settings(tmp_path):
+    cache = star.ResultCache(str(tmp_path / 'cache'), max_mb=10)
+    scope = star.ResultCache.segment_scope(24.0, make_config())
+    assert not cache.has_segments(scope)
+
+    add_entry(cache, 'k1', 10, age=0, metadata={'frames': 1, 'scope': scope})
+
+    assert cache.has_segments(scope)
+    assert not cache.has_segments(star.ResultCache.segment_scope(25.0, make_config()))
+
+
+def test_streamed_segment_digests_match_the_decoding_pass(clip):
+    enhancer = star.UltimateVideoEnhancer(make_config())
+    digests = {0: None, SEGMENT: None}
+
+    decode(enhancer, clip, segment_digests=digests)
+
+    assert [digests[0], digests[SEGMENT]] == enhancer.segment_digests(str(clip), [0, SEGMENT])
+
+
+def test_segments_do_not_depend_on_the_segment_before(clip):
+    whole = decode(star.UltimateVideoEnhancer(make_config()), clip, segment_digests={0: None, SEGMENT: None})
+    alone = decode(star.UltimateVideoEnhancer(make_config()), clip, start=SEGMENT)
+
+    assert [whole[index].hdr for index in range(SEGMENT, FRAMES)] == [alone[index].hdr for index in range(SEGMENT, FRAMES)]
+
+    # Without segment starts the smoothing carries on, which is what the cache must not see
+    carried = decode(star.UltimateVideoEnhancer(make_config()), clip)
+    assert carried[SEGMENT].hdr != alone[SEGMENT].hdr
@@ -0,0 +1,61 @@
+"""Fused and tiled stages 5-9 against the stage-by-stage reference path"""
+
+import numpy as np
+import pytest
+
+import star
+import star_bench
+
+WIDTH, HEIGHT = 240, 136
+TILE = 64
+
+LEVELS = list(star.EnhancementLevel)
+STYLES = list(star.ColorGradingStyle)
+
+
+@pytest.fixture(scope='module')
+def frames():
+    rng = np.random.default_rng(0)
+    return [star_bench.synthetic_frame(content, 3, WIDTH, HEIGHT, rng) for content in ('noise', 'shapes', 'faces')]
+
+
+def make_enhancer(level, style, **overrides):
+    config = star.ProcessingConfig(enhancement_level=level, color_grading=style, num_threads=1, **overrides)
+    return star.UltimateVideoEnhancer(config)
+
+
+def run(enhancer, process, frame):
+    # Same temporal state and grain for every path
+    enhancer.reset_temporal_state()
+    enhancer.rng = np.random.default_rng(1)
+    return process(frame.copy())
+
+
+@pytest.mark.parametrize('style', STYLES, ids=lambda style: style.value)
+@pytest.mark.parametrize('level', LEVELS, ids=lambda level: level.value)
+def test_fused_matches_the_reference_exactly(frames, level, style):
+    enhancer = make_enhancer(level, style)
+    fused = star.FusedPostProcessor(enhancer)
+    try:
+        for frame in frames:
+            expected = run(enhancer, enhancer.post_process_stages, frame)
+            assert np.array_equal(run(enhancer, fused.run, frame), expected)
+    finally:
+        enhancer.shutdown()
+
+
+@pytest.mark.parametrize('style', STYLES, ids=lambda style: style.value)
+@pytest.mark.parametrize('level', LEVELS, ids=lambda level: level.value)
+def test_tiled_is_within_one_level_of_the_reference(frames, level, style):
+    # Grain is drawn per tile, so it cannot match the whole-frame draw
+    reference = make_enhancer(level, style, enable_film_grain=False)
+    tiled = make_enhancer(level, style, enable_film_grain=False, tile_size=TILE)
+    assert isinstance(tiled.post_processor, star.TiledPostProcessor)
+    try:
+        for frame in frames:
+            expected = run(reference, reference.post_process_stages, frame)
+            difference = np.abs(run(tiled, tiled.post_processor.run, frame).astype(int) - expected)
+            assert difference.max() <= 1
+    finally:
+        reference.shutdown()
+        tiled.shutdown()
@@ -0,0 +1,165 @@
+"""Segment manifests, resumed runs and where segment workers start decoding"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+import star
+
+FRAMES = 12
+SEGMENT = 6
+SIZE = (160, 96)
+VideoCapture = cv2.VideoCapture
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, SIZE)
+    rng = np.random.default_rng(0)
+    for _ in range(FRAMES):
+        writer.write(rng.integers(0, 256, (SIZE[1], SIZE[0], 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def make_config(**overrides):
+    settings = dict(target_width=SIZE[0], target_height=SIZE[1], batch_size=4, num_threads=2,
+                    enable_face_enhancement=False)
+    settings.update(overrides)
+    return star.ProcessingConfig(**settings)
+
+
+class MissedSeekCapture:
+    """A capture whose seeks go nowhere, like a backend that cannot seek the file"""
+
+    def __init__(self, path):
+        self.cap = VideoCapture(path)
+
+    def set(self, prop, value):
+        return prop != cv2.CAP_PROP_POS_FRAMES and self.cap.set(prop, value)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg to encode the segment")
+def test_missed_seek_decodes_forward_to_the_segment_start(clip, tmp_path, monkeypatch):
+    star._init_frame_worker(make_config())
+    monkeypatch.setattr(star.cv2, 'VideoCapture', MissedSeekCapture)
+
+    result = star._process_segment(str(clip), SEGMENT, None, str(tmp_path / 'segment.mp4'), 24.0, 1)
+
+    expected = star.UltimateVideoEnhancer(make_config()).segment_digests(str(clip), [0, SEGMENT])[1]
+    assert (result['frames'], result['digest']) == (FRAMES - SEGMENT, expected)
+
+
+def test_parallel_segments_without_keyframes_run_sequentially(clip, monkeypatch):
+    monkeypatch.setattr(star, 'probe_keyframes', lambda input_path: None)
+    enhancer = star.UltimateVideoEnhancer(make_config(segment_frames=SEGMENT, parallel_segments=True))
+    enhancer.total_frames = FRAMES
+    calls = []
+    enhancer.process_segments = lambda *args: calls.append(args) or {'sequential': True}
+    enhancer.get_worker_pool = lambda: pytest.fail("no segment should be seeked to in a worker")
+
+    try:
+        assert enhancer.process_segments_parallel('cap', str(clip), 'out.mp4', 24.0) == {'sequential': True}
+    finally:
+        enhancer.shutdown()
+    assert calls == [('cap', str(clip), 'out.mp4', 24.0)]
+
+
+class StubSink:
+    """Stands in for FFmpegFrameSink: keeps the frames and writes a placeholder file"""
+
+    opened = []
+
+    def __init__(self, output_path, width, height, input_fps, config, threads=0):
+        self.output_path = Path(output_path)
+        self.frames = []
+        self.opened.append(self)
+
+    @property
+    def frames_written(self):
+        return len(self.frames)
+
+    def open(self):
+        return self
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+    def close(self):
+        self.output_path.write_bytes(b'segment')
+
+    def abort(self):
+        pass
+
+
+def test_manifest_for_another_config_or_input_is_rejected(clip, tmp_path):
+    output = str(tmp_path / 'out.mp4')
+    enhancer = star.UltimateVideoEnhancer(make_config(segment_frames=SEGMENT, resume=True))
+    manifest = enhancer.open_segment_manifest(str(clip), output)
+    (manifest.directory / 'segment_00000.mp4').write_bytes(b'segment')
+    manifest.mark_done(0, 0, SEGMENT, 'segment_00000.mp4')
+
+    assert enhancer.open_segment_manifest(str(clip), output).is_done(0)
+
+    other_config = star.UltimateVideoEnhancer(make_config(segment_frames=SEGMENT, resume=True, hdr_smoothing=0.5))
+    assert not other_config.open_segment_manifest(str(clip), output).is_done(0)
+    assert not (manifest.directory / 'segment_00000.mp4').exists()
+
+    manifest = enhancer.open_segment_manifest(str(clip), output)
+    (manifest.directory / 'segment_00000.mp4').write_bytes(b'segment')
+    manifest.mark_done(0, 0, SEGMENT, 'segment_00000.mp4')
+    os.utime(clip, ns=(clip.stat().st_atime_ns, clip.stat().st_mtime_ns + 1))
+    assert not enhancer.open_segment_manifest(str(clip), output).is_done(0)
+
+
+def test_resumed_manifest_drops_segments_whose_files_are_gone(tmp_path):
+    directory = tmp_path / 'out.segments'
+    manifest = star.SegmentManifest.open(directory, {'input': 'a'}, SEGMENT, resume=True)
+    (directory / 'segment_00000.mp4').write_bytes(b'segment')
+    manifest.mark_done(0, 0, SEGMENT, 'segment_00000.mp4')
+    manifest.mark_done(1, SEGMENT, SEGMENT, 'segment_00001.mp4')
+
+    resumed = star.SegmentManifest.open(directory, {'input': 'a'}, SEGMENT, resume=True)
+
+    assert (resumed.is_done(0), resumed.is_done(1)) == (True, False)
+
+
+def test_finished_segments_are_skipped(clip, tmp_path, monkeypatch):
+    config = make_config(segment_frames=SEGMENT, resume=True, queue_depth=FRAMES)
+    # Batches run on threads here, with the enhancer a pool worker would build
+    star._init_frame_worker(config)
+    monkeypatch.setattr(star, '_worker_ring', None)
+    monkeypatch.setattr(star, 'FFmpegFrameSink', StubSink)
+    monkeypatch.setattr(StubSink, 'opened', [])
+    enhancer = star.UltimateVideoEnhancer(config)
+    enhancer.total_frames = FRAMES
+    enhancer.worker_pool = ThreadPoolExecutor(max_workers=1)
+    joined = []
+    enhancer.concat_segments = lambda files, output_path: joined.extend(files) or {'output_file_size_mb': 1.0}
+
+    output = str(tmp_path / 'out.mp4')
+    manifest = enhancer.open_segment_manifest(str(clip), output)
+    (manifest.directory / 'segment_00000.mp4').write_bytes(b'finished earlier')
+    manifest.mark_done(0, 0, SEGMENT, 'segment_00000.mp4')
+
+    cap = cv2.VideoCapture(str(clip))
+    try:
+        stats = enhancer.process_segments(cap, str(clip), output, 24.0)
+    finally:
+        cap.release()
+        enhancer.shutdown()
+
+    assert [sink.output_path.name for sink in StubSink.opened] == ['segment_00001.part.mp4']
+    assert len(StubSink.opened[0].frames) == FRAMES - SEGMENT
+    assert enhancer.processed_frames == FRAMES - SEGMENT
+    assert [path.name for path in joined] == ['segment_00000.mp4', 'segment_00001.mp4']
+    assert (stats['segments'], stats['segments_resumed'], stats['frames_encoded']) == (2, 1, FRAMES)
@@ -0,0 +1,157 @@
+"""The streaming pipeline: batch deadlines, worker pool recovery, frame order and duplicates"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import pytest
+
+import star
+
+FRAMES = 12
+SIZE = (160, 96)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, SIZE)
+    rng = np.random.default_rng(0)
+    for _ in range(FRAMES):
+        writer.write(rng.integers(0, 256, (SIZE[1], SIZE[0], 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class HangingPool:
+    """Runs batches on threads in this process, except ``hang`` which never finish
+
+    Shutting the pool down fails the hung futures, like terminating a process pool does.
+    """
+
+    def __init__(self, hang):
+        self.hang = set(hang)
+        self.submitted = 0
+        self.hung = []
+        self.shut_down = False
+        # One thread: the batches share this process's worker enhancer and its buffers
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        if self.submitted in self.hang:
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self.hung.append(future)
+            return future
+        return self.executor.submit(fn, *args)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+        for future in self.hung:
+            if not future.done():
+                future.set_exception(BrokenProcessPool("terminated"))
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class DyingPool(HangingPool):
+    """A pool whose first batch finds a worker dead, failing the rest once it is shut down"""
+
+    def __init__(self):
+        super().__init__(hang=range(1, 100))
+
+    def submit(self, fn, *args):
+        future = super().submit(fn, *args)
+        if self.submitted == 1:
+            future.set_exception(BrokenProcessPool("a worker died"))
+        return future
+
+
+@pytest.fixture
+def enhancer(monkeypatch):
+    config = star.ProcessingConfig(target_width=SIZE[0], target_height=SIZE[1], batch_size=4, queue_depth=12,
+                                   num_threads=1, enable_face_enhancement=False)
+    # Batches run in this process, with the enhancer a pool worker would build
+    star._init_frame_worker(config)
+    monkeypatch.setattr(star, '_worker_ring', None)
+    enhancer = star.UltimateVideoEnhancer(config)
+    enhancer.total_frames = FRAMES
+    yield enhancer
+    enhancer.shutdown()
+
+
+def stream(enhancer, clip, pools):
+    """Stream the clip with each new worker pool taken from ``pools``; returns frames by index"""
+
+    def get_worker_pool():
+        if enhancer.worker_pool is None:
+            enhancer.worker_pool = pools.pop(0)
+        return enhancer.worker_pool
+
+    enhancer.get_worker_pool = get_worker_pool
+    cap = cv2.VideoCapture(str(clip))
+    output = {}
+    try:
+        enhancer.stream_frames(cap, lambda frame_idx, frame: output.setdefault(frame_idx, frame.copy()))
+    finally:
+        cap.release()
+    return output
+
+
+def test_batch_past_its_deadline_passes_through_and_the_pool_is_replaced(enhancer, clip, monkeypatch):
+    monkeypatch.setattr(star, 'BATCH_TIMEOUT', 1.0)
+    hanging, fresh = HangingPool(hang={2}), HangingPool(hang=())
+
+    output = stream(enhancer, clip, [hanging, fresh])
+
+    assert sorted(output) == list(range(FRAMES))
+    assert enhancer.worker_pool is not hanging and hanging.executor._shutdown
+
+    # Frames 4-7 went to the hung batch and come out as decoded; the rest are enhanced
+    assert enhancer.fallback_frames == 4
+    cap = cv2.VideoCapture(str(clip))
+    decoded = [cap.read()[1] for _ in range(FRAMES)]
+    cap.release()
+    for index in range(FRAMES):
+        assert np.array_equal(output[index], decoded[index]) == (4 <= index < 8)
+
+
+def test_broken_pool_is_shut_down_and_later_failures_keep_the_fresh_pool(enhancer, clip, monkeypatch):
+    # Two batches in flight, so the second fails after the first brought in a fresh pool
+    monkeypatch.setattr(enhancer.config, 'queue_depth', 8)
+    dying, fresh = DyingPool(), HangingPool(hang=())
+
+    output = stream(enhancer, clip, [dying, fresh])
+
+    assert sorted(output) == list(range(FRAMES))
+    assert dying.shut_down
+    assert enhancer.worker_pool is fresh and not fresh.shut_down
+    assert enhancer.fallback_frames == 8
+
+
+def test_reorder_buffer_releases_frames_in_order():
+    reorder = star.FrameReorderBuffer(start_idx=10)
+
+    assert reorder.push(12, 'c') == []
+    assert reorder.push(11, 'b') == []
+    assert len(reorder) == 2
+    assert reorder.push(10, 'a') == [(10, 'a'), (11, 'b'), (12, 'c')]
+    assert reorder.push(14, 'e') == []
+    assert reorder.push(13, 'd') == [(13, 'd'), (14, 'e')]
+    assert len(reorder) == 0
+
+
+def test_duplicate_gate_compares_against_the_last_frame_let_through():
+    gate = star.DuplicateFrameGate(threshold=2.0)
+    frame = np.full((SIZE[1], SIZE[0], 3), 100, dtype=np.uint8)
+
+    assert not gate.is_duplicate(frame)
+    assert gate.is_duplicate(frame.copy())
+    assert gate.is_duplicate(frame + 1)
+
+    # A slow drift is measured from the reference, not from the previous frame
+    assert gate.is_duplicate(frame + 1)
+    assert not gate.is_duplicate(frame + 2)
+    assert gate.is_duplicate(frame + 3)
+    assert not gate.is_duplicate(frame + 5)
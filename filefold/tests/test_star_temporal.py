@@ -0,0 +1,113 @@
+"""Temporal state (HDR smoothing, face tracking) must not restart at batch boundaries"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import star
+
+FRAMES = 12
+SIZE = (160, 96)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    """Gradient clip that brightens steadily: no scene cut, so every frame is smoothed"""
+    path = tmp_path / "ramp.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, SIZE)
+    gradient = np.tile(np.linspace(20, 200, SIZE[0], dtype=np.float32), (SIZE[1], 1))
+    for index in range(FRAMES):
+        frame = np.clip(gradient * (0.6 + 0.04 * index), 0, 255).astype(np.uint8)
+        writer.write(cv2.merge([frame, frame, frame]))
+    writer.release()
+    return path
+
+
+def make_enhancer(batch_size, hdr_smoothing=0.8):
+    config = star.ProcessingConfig(target_width=SIZE[0], target_height=SIZE[1], batch_size=batch_size,
+                                   queue_depth=FRAMES + 4, num_threads=1, face_detect_interval=5,
+                                   hdr_smoothing=hdr_smoothing)
+    return star.UltimateVideoEnhancer(config)
+
+
+def decode_analyses(enhancer, clip):
+    """Run the streaming decoder thread's body and collect (idx, analysis) in order"""
+    cap = cv2.VideoCapture(str(clip))
+    ring = star.SharedFrameRing.create(FRAMES + 4, (SIZE[1], SIZE[0], 3), (SIZE[1], SIZE[0], 3))
+    free_slots = queue.Queue()
+    for slot in range(ring.slots):
+        free_slots.put(slot)
+    batches = queue.Queue()
+    try:
+        enhancer.reset_temporal_state()
+        enhancer._decode_batches(cap, ring, free_slots, batches, threading.Event())
+        items = []
+        while True:
+            batch = batches.get_nowait()
+            if batch is None:
+                break
+            items.extend((frame_idx, analysis) for frame_idx, _, analysis in batch)
+        return items
+    finally:
+        cap.release()
+        ring.close()
+        ring.unlink()
+
+
+def test_hdr_statistics_do_not_depend_on_batching(clip):
+    reference = [analysis.hdr for _, analysis in decode_analyses(make_enhancer(FRAMES), clip)]
+    assert len(reference) == FRAMES
+    
+    for batch_size in (1, 4, 5):
+        items = decode_analyses(make_enhancer(batch_size), clip)
+        assert [frame_idx for frame_idx, _ in items] == list(range(FRAMES))
+        assert [analysis.hdr for _, analysis in items] == reference
+
+
+def test_hdr_curve_stays_continuous_across_batch_boundaries(clip):
+    enhancer = make_enhancer(4)
+    raw = make_enhancer(4, hdr_smoothing=0.0)
+    
+    smoothed = [analysis.hdr for _, analysis in decode_analyses(enhancer, clip)]
+    unsmoothed = [analysis.hdr for _, analysis in decode_analyses(raw, clip)]
+    
+    # A reset would make a batch's first frame use its raw statistics; every frame after
+    # the first, batch starts 4 and 8 included, must lag them instead
+    for index in range(1, FRAMES):
+        assert smoothed[index] != unsmoothed[index]
+    
+    # And the exposure moves no more across a batch boundary than inside a batch
+    curves = [enhancer.hdr_curve(*stats).astype(int) for stats in smoothed]
+    jumps = {index: np.abs(curves[index] - curves[index - 1]).max() for index in range(1, FRAMES)}
+    inside = [jump for index, jump in jumps.items() if index % 4]
+    assert max(jumps[4], jumps[8]) <= max(inside)
+
+
+def test_face_detection_keeps_its_interval_across_batches(clip, monkeypatch):
+    enhancer = make_enhancer(4)
+    calls = []
+    detect = enhancer.face_tracker.detect
+    monkeypatch.setattr(enhancer.face_tracker, 'detect', lambda gray: (calls.append(1), detect(gray)))
+    
+    decode_analyses(enhancer, clip)
+    
+    # Frames 0, 5 and 10, not every batch start (0, 4, 8)
+    assert len(calls) == 3
+
+
+def test_worker_output_depends_only_on_the_analysis(clip):
+    cap = cv2.VideoCapture(str(clip))
+    frames = [cap.read()[1] for _ in range(3)]
+    cap.release()
+    
+    analysis = make_enhancer(4).analyze_frame(frames[2])
+    fresh = make_enhancer(4)
+    warmed = make_enhancer(4)
+    for frame in frames[:2]:
+        warmed.process_frame_ultimate(frame)
+    
+    assert np.array_equal(fresh.process_frame_ultimate(frames[2], analysis=analysis),
+                          warmed.process_frame_ultimate(frames[2], analysis=analysis))